@@ -0,0 +1,210 @@
+import discord
+from discord.ext import commands
+from utils.embeds import EmbedTemplates
+from datetime import datetime, timezone
+import asyncio
+import time
+import numpy as np
+
+ACTIVITY_FLUSH_INTERVAL = 60  # Seconds between writes of the in-memory message counters
+ACTIVITY_DOWNSAMPLE_INTERVAL = 86400  # Seconds between folding old hourly rows into daily rows
+ACTIVITY_HOURLY_DAYS = 30  # Days of hourly rows kept before they are folded into days
+ACTIVITY_DAILY_DAYS = 365  # Days of daily rows kept at all
+STATS_TOP_CHANNELS = 5
+SPARK_BLOCKS = "▁▂▃▄▅▆▇█"
+
+def sparkline(values):
+    """Render an array of counts as a row of block characters"""
+    peak = values.max()
+    if peak <= 0:
+        return SPARK_BLOCKS[0] * len(values)
+    steps = np.ceil(values / peak * (len(SPARK_BLOCKS) - 1)).astype(int)
+    return "".join(SPARK_BLOCKS[step] for step in steps)
+
+def summarize_activity(channels, hours, counts, now_hour, days=ACTIVITY_HOURLY_DAYS):
+    """Aggregate hourly rollup columns into per-hour-of-day, per-day and per-channel totals"""
+    channels = np.asarray(channels, dtype=np.int64)
+    hours = np.asarray(hours, dtype=np.int64)
+    counts = np.asarray(counts, dtype=np.int64)
+    by_hour = np.bincount(hours % 24, weights=counts, minlength=24).astype(np.int64)
+    # Day 0 is the oldest day in the window, day days-1 is today
+    day_index = hours // 24 - (now_hour // 24 - days + 1)
+    in_window = (day_index >= 0) & (day_index < days)
+    by_day = np.bincount(day_index[in_window], weights=counts[in_window], minlength=days).astype(np.int64)
+    channel_ids, inverse = np.unique(channels, return_inverse=True)
+    by_channel = np.bincount(inverse, weights=counts, minlength=len(channel_ids)).astype(np.int64)
+    order = np.argsort(by_channel)[::-1]
+    return by_hour, by_day, channel_ids[order], by_channel[order]
+
+class Analytics(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+        self.counters = {}  # (guild_id, channel_id, hour since epoch): messages not yet written
+        self.flush_lock = asyncio.Lock()
+        self.flush_stop = asyncio.Event()  # set on unload so the flush loop exits between writes
+        self.flush_task = None
+        self.last_downsample = 0.0
+        self.start_activity_flusher()
+
+    async def cog_unload(self):
+        # Cancelling mid-write would drop the batch the flush already took, so let it finish
+        self.flush_stop.set()
+        if self.flush_task:
+            await self.flush_task
+        await self.flush_activity()
+
+    def get_metrics(self):
+        """Sizes of the in-memory activity counters, for the /metrics endpoint"""
+        return {
+            'analytics_pending_counters': len(self.counters)
+        }
+
+    def start_activity_flusher(self):
+        """Start the background task that writes activity counters to the database"""
+        if self.flush_task is None or self.flush_task.done():
+            self.flush_task = asyncio.create_task(self.activity_flush_loop())
+
+    async def activity_flush_loop(self):
+        while not self.bot.is_closed() and not self.flush_stop.is_set():
+            try:
+                await asyncio.wait_for(self.flush_stop.wait(), ACTIVITY_FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            await self.flush_activity()
+            if not self.flush_stop.is_set() and time.monotonic() - self.last_downsample >= ACTIVITY_DOWNSAMPLE_INTERVAL:
+                await self.downsample_activity()
+
+    async def flush_activity(self):
+        """Add every buffered counter to the hourly rollup in one statement"""
+        async with self.flush_lock:
+            if not self.counters or not self.bot.db:
+                return
+            batch, self.counters = self.counters, {}
+            guild_ids, channel_ids, hours, counts = zip(*((*key, count) for key, count in batch.items()))
+            try:
+                await self.bot.db.execute("""
+                    INSERT INTO activity_hourly (guild_id, channel_id, hour, messages)
+                    SELECT * FROM unnest($1::bigint[], $2::bigint[], $3::int[], $4::int[])
+                    ON CONFLICT (guild_id, channel_id, hour) DO UPDATE
+                    SET messages = activity_hourly.messages + EXCLUDED.messages
+                """, guild_ids, channel_ids, hours, counts)
+            except Exception as e:
+                print(f"Error flushing activity counters: {e}")
+                # Merge the batch back so the counts go out with the next flush
+                for key, count in batch.items():
+                    self.counters[key] = self.counters.get(key, 0) + count
+
+    async def downsample_activity(self):
+        """Fold hourly rows past the hourly window into daily rows and drop expired days"""
+        if not self.bot.db:
+            return
+        now_hour = int(time.time()) // 3600
+        try:
+            async with self.bot.db.acquire() as conn:
+                async with conn.transaction():
+                    await conn.execute("""
+                        WITH moved AS (
+                            DELETE FROM activity_hourly WHERE hour < $1
+                            RETURNING guild_id, channel_id, hour / 24 AS day, messages
+                        )
+                        INSERT INTO activity_daily (guild_id, channel_id, day, messages)
+                        SELECT guild_id, channel_id, day, SUM(messages) FROM moved
+                        GROUP BY guild_id, channel_id, day
+                        ON CONFLICT (guild_id, channel_id, day) DO UPDATE
+                        SET messages = activity_daily.messages + EXCLUDED.messages
+                    """, (now_hour // 24 - ACTIVITY_HOURLY_DAYS + 1) * 24)
+                    await conn.execute(
+                        "DELETE FROM activity_daily WHERE day < $1", now_hour // 24 - ACTIVITY_DAILY_DAYS
+                    )
+            self.last_downsample = time.monotonic()
+        except Exception as e:
+            print(f"Error downsampling activity: {e}")
+
+    @commands.Cog.listener()
+    async def on_message(self, message):
+        if message.author.bot or not message.guild:
+            return
+        key = (message.guild.id, message.channel.id, int(message.created_at.timestamp()) // 3600)
+        self.counters[key] = self.counters.get(key, 0) + 1
+
+    @commands.command(name='serverstats', aliases=['activity'])
+    async def serverstats(self, ctx):
+        """Show message activity for the last 30 days"""
+        if not self.bot.db:
+            embed = EmbedTemplates.error(
+                "Database Error",
+                "Database connection not available.",
+                ctx.author
+            )
+            await ctx.send(embed=embed)
+            return
+
+        try:
+            await self.flush_activity()
+            now_hour = int(time.time()) // 3600
+            # Aggregate columns come back as three arrays, so NumPy does the grouping
+            row = await self.bot.db.fetchrow("""
+                SELECT COALESCE(array_agg(channel_id), '{}') AS channels,
+                       COALESCE(array_agg(hour), '{}') AS hours,
+                       COALESCE(array_agg(messages), '{}') AS counts
+                FROM activity_hourly
+                WHERE guild_id = $1 AND hour >= $2
+            """, ctx.guild.id, (now_hour // 24 - ACTIVITY_HOURLY_DAYS + 1) * 24)
+
+            if not row['counts']:
+                embed = EmbedTemplates.info(
+                    "No Activity Yet",
+                    "No messages have been counted in this server yet.",
+                    ctx.author
+                )
+                await ctx.send(embed=embed)
+                return
+
+            by_hour, by_day, channel_ids, by_channel = summarize_activity(
+                row['channels'], row['hours'], row['counts'], now_hour
+            )
+            total = int(by_day.sum())
+
+            embed = discord.Embed(
+                title=f"📈 Activity in {ctx.guild.name}",
+                description=f"**{total:,}** messages in the last {ACTIVITY_HOURLY_DAYS} days",
+                color=0x5865f2,
+                timestamp=datetime.now()
+            )
+            busiest = int(by_hour.argmax())
+            embed.add_field(
+                name="Messages per Hour (UTC)",
+                value=f"`{sparkline(by_hour)}`\n`00    06    12    18    `\nBusiest hour: **{busiest:02d}:00** ({int(by_hour[busiest]):,} messages)",
+                inline=False
+            )
+            first_day = datetime.fromtimestamp((now_hour // 24 - ACTIVITY_HOURLY_DAYS + 1) * 86400, timezone.utc)
+            embed.add_field(
+                name="Messages per Day",
+                value=f"`{sparkline(by_day)}`\nSince {first_day:%b %d} • Daily average: **{total / ACTIVITY_HOURLY_DAYS:,.1f}**",
+                inline=False
+            )
+
+            lines = []
+            for channel_id, count in zip(channel_ids.tolist(), by_channel.tolist()):
+                channel = ctx.guild.get_channel(channel_id)
+                # Only list channels the requester can read
+                if channel and channel.permissions_for(ctx.author).read_messages:
+                    lines.append(f"{channel.mention} • {count:,} messages")
+                    if len(lines) == STATS_TOP_CHANNELS:
+                        break
+            if lines:
+                embed.add_field(name="Top Channels", value="\n".join(lines), inline=False)
+
+            embed.set_footer(text=f"Requested by {ctx.author.display_name}")
+            await ctx.send(embed=embed)
+
+        except Exception as e:
+            embed = EmbedTemplates.error(
+                "Stats Error",
+                f"Failed to load server stats. Error: {str(e)}",
+                ctx.author
+            )
+            await ctx.send(embed=embed)
+
+async def setup(bot):
+    await bot.add_cog(Analytics(bot))
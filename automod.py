@@ -1,16 +1,447 @@
 import discord
 from discord.ext import commands
 import asyncio
+import hashlib
+import mmap
+import os
 import re
-from collections import defaultdict, deque
-from datetime import datetime, timedelta
+import struct
+import sys
+import time
+from array import array
+from collections import OrderedDict, deque
 from utils.embeds import EmbedTemplates
+from cogs.timers import delete_message_ids
+
+# Default NSFW keywords: True matches whole words only, False matches anywhere in a word.
+# Short words are whole-word so "class", "assess" and "title" aren't flagged
+DEFAULT_NSFW_KEYWORDS = {
+    'sex': True, 'porn': False, 'nsfw': False, 'nude': True, 'naked': True, 'xxx': True,
+    'adult': True, 'erotic': False, 'sexual': True, 'penis': True, 'vagina': True,
+    'breast': True, 'boob': True, 'boobs': True, 'tit': True, 'tits': True, 'ass': True,
+    'dick': True, 'cock': True, 'pussy': True, 'fuck': False, 'shit': True, 'bitch': True,
+    'damn': True, 'orgasm': False, 'masturbat': False, 'horny': True, 'aroused': True,
+    'kinky': True, 'fetish': False
+}
+
+class KeywordMatcher:
+    """Aho-Corasick automaton that finds any of a set of keywords in one pass over the text.
+    
+    Each keyword is either matched anywhere or only as a whole word, where the
+    characters around it must not be letters or digits.
+    """
+    def __init__(self, keywords):
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [()]  # node: ((keyword, whole_word), ...) ending there, via fail links too
+        for keyword, whole_word in keywords.items():
+            node = 0
+            for char in keyword:
+                next_node = self.goto[node].get(char)
+                if next_node is None:
+                    next_node = len(self.goto)
+                    self.goto[node][char] = next_node
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append(())
+                node = next_node
+            self.output[node] += ((keyword, whole_word),)
+            
+        # Breadth-first, so every fail target is finished before it is used
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self.goto[node].items():
+                queue.append(child)
+                target = self.fail[node]
+                while target and char not in self.goto[target]:
+                    target = self.fail[target]
+                fallback = self.goto[target].get(char, 0)
+                self.fail[child] = fallback if fallback != child else 0
+                self.output[child] += self.output[self.fail[child]]
+                
+    def __len__(self):
+        return sum(len(output) for output in self.output)
+    
+    def search(self, text):
+        """Return the first keyword found in lowercased text, or None"""
+        goto, fail, output = self.goto, self.fail, self.output
+        node = 0
+        for end, char in enumerate(text):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            for keyword, whole_word in output[node]:
+                if not whole_word:
+                    return keyword
+                start = end - len(keyword) + 1
+                if (start == 0 or not text[start - 1].isalnum()) and (
+                    end + 1 == len(text) or not text[end + 1].isalnum()
+                ):
+                    return keyword
+        return None
+
+DEFAULT_NSFW_MATCHER = KeywordMatcher(DEFAULT_NSFW_KEYWORDS)
+
+SPAM_EVICT_INTERVAL = 60  # Seconds between sweeps for idle spam windows
+SPAM_MAX_WINDOW = 60  # Longest spam_time configure_spam allows; older windows are idle
+
+NOTICE_LIFETIME = 5  # Seconds automod notices stay up
+
+class SpamDetector:
+    """Sliding windows of recent messages per (guild_id, user_id).
+    
+    Each window holds at most the guild's spam_messages entries, so memory per
+    user is bounded by the setting, and idle windows are dropped by evict().
+    """
+    def __init__(self):
+        self.windows = {}  # (guild_id, user_id): deque of (monotonic time, (channel_id, message_id))
+        self.evictions = 0
+        self.triggers = 0
+        
+    def __len__(self):
+        return len(self.windows)
+    
+    def hit(self, key, limit, period, message_ref, now=None):
+        """Record a (channel_id, message_id) and return the whole burst once it is the
+        limit-th message within period seconds, otherwise None"""
+        if now is None:
+            now = time.monotonic()
+        window = self.windows.get(key)
+        if window is None or window.maxlen != limit:
+            # New user, or the guild changed spam_messages since the window was made
+            window = deque(window or (), maxlen=limit)
+            self.windows[key] = window
+        window.append((now, message_ref))
+        if len(window) == limit and now - window[0][0] <= period:
+            burst = [ref for _, ref in window]
+            window.clear()
+            self.triggers += 1
+            return burst
+        return None
+    
+    def evict(self, idle=SPAM_MAX_WINDOW, now=None):
+        """Drop windows whose newest message is older than idle seconds"""
+        if now is None:
+            now = time.monotonic()
+        stale = [key for key, window in self.windows.items() if not window or now - window[-1][0] > idle]
+        for key in stale:
+            del self.windows[key]
+        self.evictions += len(stale)
+        return len(stale)
+
+DUPLICATE_RING_SIZE = 256  # Recent fingerprints kept per guild
+DUPLICATE_WINDOW = 300  # Seconds a fingerprint stays comparable
+DUPLICATE_DISTANCE = 12  # Max differing bits out of 64; unrelated messages differ in about 32
+DUPLICATE_CHANNELS = 3  # Distinct channels a payload must reach before it is flagged
+DUPLICATE_MIN_LENGTH = 20  # Shorter messages ("hi", "lol") repeat innocently
+FINGERPRINT_MASK = (1 << 64) - 1
+token_pattern = re.compile(r'\w+')
+
+def simhash(text):
+    """64-bit SimHash of a message's words and word pairs; similar texts differ in few bits"""
+    words = token_pattern.findall(text.lower())
+    features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    if not features:
+        return 0
+    threshold = len(features) / 2
+    # Columns of the features' bit strings are counted in C; a bit is set when most features set it
+    bits = [format(hash(feature) & FINGERPRINT_MASK, '064b') for feature in features]
+    return int(''.join('1' if column.count('1') > threshold else '0' for column in zip(*bits)), 2)
+
+class DuplicateDetector:
+    """Bounded ring of recent message fingerprints per guild.
+    
+    Flags a user once near-identical messages from them show up in enough
+    different channels within the window.
+    """
+    def __init__(self):
+        self.rings = {}  # guild_id: deque of (monotonic time, user_id, channel_id, fingerprint)
+        self.triggers = 0
+        
+    def __len__(self):
+        return sum(len(ring) for ring in self.rings.values())
+    
+    def check(self, guild_id, user_id, channel_id, content, now=None):
+        """Record a message and return True when it repeats across too many channels"""
+        if len(content) < DUPLICATE_MIN_LENGTH:
+            return False
+        if now is None:
+            now = time.monotonic()
+        fingerprint = simhash(content)
+        ring = self.rings.get(guild_id)
+        if ring is None:
+            ring = self.rings[guild_id] = deque(maxlen=DUPLICATE_RING_SIZE)
+            
+        channels = {channel_id}
+        for seen_at, seen_user_id, seen_channel_id, seen_fingerprint in ring:
+            if (
+                seen_user_id == user_id
+                and now - seen_at <= DUPLICATE_WINDOW
+                and (seen_fingerprint ^ fingerprint).bit_count() <= DUPLICATE_DISTANCE
+            ):
+                channels.add(seen_channel_id)
+        ring.append((now, user_id, channel_id, fingerprint))
+        
+        if len(channels) >= DUPLICATE_CHANNELS:
+            # Forget this user's fingerprints so one burst is flagged once
+            self.rings[guild_id] = deque((entry for entry in ring if entry[1] != user_id), maxlen=DUPLICATE_RING_SIZE)
+            self.triggers += 1
+            return True
+        return False
+    
+    def evict(self, now=None):
+        """Drop rings whose newest fingerprint has aged out of the window"""
+        if now is None:
+            now = time.monotonic()
+        stale = [guild_id for guild_id, ring in self.rings.items() if not ring or now - ring[-1][0] > DUPLICATE_WINDOW]
+        for guild_id in stale:
+            del self.rings[guild_id]
+        return len(stale)
+
+BLOCKLIST_PATH = os.getenv('PHISHING_BLOCKLIST', 'phishing_domains.txt')  # One domain per line
+BLOCKLIST_CHECK_INTERVAL = 60  # Seconds between checks for an updated blocklist file
+BLOCKLIST_MAGIC = b'MEWABL01'
+BLOCKLIST_HEADER = struct.Struct('<8sQQQ')  # magic, source mtime_ns, source size, domain count
+url_host_pattern = re.compile(
+    r'(?:https?://(?:[^\s/@]+@)?)?((?:[a-z0-9](?:[a-z0-9-]{0,61}[a-z0-9])?\.)+[a-z][a-z0-9-]{1,62})(?![a-z0-9-])',
+    re.IGNORECASE
+)
+
+def domain_hash(domain):
+    """64-bit key for a lowercased domain in the blocklist index"""
+    return int.from_bytes(hashlib.blake2b(domain.encode(), digest_size=8).digest(), 'little')
+
+def build_blocklist_index(source_path, index_path):
+    """Compile a domain list into a sorted array of 64-bit hashes behind a small header"""
+    stat = os.stat(source_path)
+    hashes = set()
+    with open(source_path, encoding='utf-8', errors='ignore') as file:
+        for line in file:
+            # Accept hosts-file lines ("0.0.0.0 evil.com") and comments as well as bare domains
+            fields = line.split('#', 1)[0].split()
+            if fields:
+                hashes.add(domain_hash(fields[-1].strip('.').lower()))
+    keys = array('Q', sorted(hashes))
+    temp_path = index_path + '.tmp'
+    with open(temp_path, 'wb') as file:
+        file.write(BLOCKLIST_HEADER.pack(BLOCKLIST_MAGIC, stat.st_mtime_ns, stat.st_size, len(keys)))
+        # The index is little-endian on every platform
+        if sys.byteorder != 'little':
+            keys.byteswap()
+        keys.tofile(file)
+    os.replace(temp_path, index_path)
+
+class DomainBlocklist:
+    """Phishing domains looked up in a memory-mapped, sorted array of hashes.
+    
+    The list stays on disk: a lookup hashes the host and each parent domain and
+    binary searches the mapped file, so it costs O(labels * log n) and no Python
+    object per domain. reload() rebuilds and swaps the map when the source changes.
+    """
+    def __init__(self, source_path=BLOCKLIST_PATH):
+        self.source_path = source_path
+        self.index_path = source_path + '.idx'
+        self.signature = None  # (mtime_ns, size) of the source the map was built from
+        self.index = (None, 0)  # (mmap, domain count), replaced as one object on reload
+        self.reloads = 0
+        
+    def __len__(self):
+        return self.index[1]
+    
+    def _source_signature(self):
+        try:
+            stat = os.stat(self.source_path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+    
+    def _index_signature(self):
+        try:
+            with open(self.index_path, 'rb') as file:
+                magic, mtime_ns, size, count = BLOCKLIST_HEADER.unpack(file.read(BLOCKLIST_HEADER.size))
+        except (FileNotFoundError, struct.error):
+            return None
+        return (mtime_ns, size) if magic == BLOCKLIST_MAGIC else None
+    
+    def reload(self):
+        """Rebuild and remap the index if the source file changed; returns whether it did.
+        
+        Blocking file work, meant to run in a thread.
+        """
+        signature = self._source_signature()
+        if signature == self.signature:
+            return False
+        if signature is None:
+            self.index, self.signature = (None, 0), None
+            return True
+        if self._index_signature() != signature:
+            build_blocklist_index(self.source_path, self.index_path)
+        with open(self.index_path, 'rb') as file:
+            new_map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, mtime_ns, size, count = BLOCKLIST_HEADER.unpack_from(new_map, 0)
+        # Lookups read self.index once, so they never pair a new map with an old count;
+        # the old map is released once nothing references it
+        self.index = (new_map, count)
+        self.signature = (mtime_ns, size)
+        self.reloads += 1
+        return True
+    
+    def _contains(self, index, key):
+        index_map, count = index
+        low, high = 0, count
+        while low < high:
+            middle = (low + high) // 2
+            value = struct.unpack_from('<Q', index_map, BLOCKLIST_HEADER.size + middle * 8)[0]
+            if value < key:
+                low = middle + 1
+            elif value > key:
+                high = middle
+            else:
+                return True
+        return False
+    
+    def blocked_domain(self, host):
+        """Return the listed domain covering host (itself or a parent), or None"""
+        index = self.index
+        if not index[1]:
+            return None
+        labels = host.lower().strip('.').split('.')
+        # Stop before the bare TLD
+        for start in range(len(labels) - 1):
+            domain = '.'.join(labels[start:])
+            if self._contains(index, domain_hash(domain)):
+                return domain
+        return None
+    
+    def scan(self, text):
+        """Return the first blocked domain linked in text, or None"""
+        if not len(self):
+            return None
+        for match in url_host_pattern.finditer(text):
+            domain = self.blocked_domain(match.group(1))
+            if domain:
+                return domain
+        return None
+
+INVITE_CACHE_TTL = 3600  # Seconds a resolved invite's target guild is trusted
+INVITE_NEGATIVE_TTL = 600  # Seconds an invalid or expired invite code is remembered
+INVITE_CACHE_SIZE = 5000
+invite_code_pattern = re.compile(
+    r'(?:https?://)?(?:www\.)?(?:discord(?:app)?\.com/invite|discord\.gg|discord\.(io|me|li))/([a-z0-9-]+)',
+    re.IGNORECASE
+)
+
+class InviteCache:
+    """TTL cache from invite code to target guild ID, in front of an invite resolver.
+    
+    resolver is an async callable taking a code and returning the guild ID, or None
+    when the invite doesn't exist. Both answers are cached; concurrent lookups of
+    one code share a single call. Passing a local resolver keeps the API out of tests.
+    """
+    def __init__(self, resolver, ttl=INVITE_CACHE_TTL, negative_ttl=INVITE_NEGATIVE_TTL, max_size=INVITE_CACHE_SIZE):
+        self.resolver = resolver
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_size = max_size
+        self.entries = OrderedDict()  # code: (expires_at, guild_id or None)
+        self.in_flight = {}  # code: task resolving it
+        self.hits = 0
+        self.misses = 0
+        
+    def __len__(self):
+        return len(self.entries)
+    
+    async def resolve(self, code, now=None):
+        """Get the guild ID an invite code points to, or None for a dead invite"""
+        if now is None:
+            now = time.monotonic()
+        entry = self.entries.get(code)
+        if entry is not None and entry[0] > now:
+            self.entries.move_to_end(code)
+            self.hits += 1
+            return entry[1]
+            
+        task = self.in_flight.get(code)
+        if task is None:
+            self.misses += 1
+            task = asyncio.ensure_future(self.resolver(code))
+            self.in_flight[code] = task
+            task.add_done_callback(lambda task: self.store(code, now, task))
+        # Every caller is shielded, so one cancelled caller can't cancel the lookup for the rest
+        return await asyncio.shield(task)
+    
+    def store(self, code, now, task):
+        """Cache a finished lookup; errors other than a dead invite reach the callers and are not cached"""
+        self.in_flight.pop(code, None)
+        if task.cancelled() or task.exception() is not None:
+            return
+        guild_id = task.result()
+        self.entries[code] = (now + (self.ttl if guild_id is not None else self.negative_ttl), guild_id)
+        self.entries.move_to_end(code)
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
 
 class AutoMod(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.spam_tracker = defaultdict(lambda: deque(maxlen=5))  # Track last 5 messages per user
-        self.discord_link_pattern = re.compile(r'(https?://)?(www\.)?(discord\.(gg|io|me|li)|discordapp\.com/invite)/.+', re.IGNORECASE)
+        self.spam_detector = SpamDetector()
+        self.duplicate_detector = DuplicateDetector()
+        self.spam_evict_task = None
+        self.invite_cache = InviteCache(self.fetch_invite_guild)
+        self.invite_allowlists = {}  # guild_id: frozenset of guild IDs whose invites may be posted
+        self.nsfw_matchers = {}  # guild_id: compiled KeywordMatcher, dropped when the word list changes
+        self.blocklist = DomainBlocklist()
+        self.blocklist_task = None
+        self.start_spam_evictor()
+        self.start_blocklist_watcher()
+        
+    async def cog_unload(self):
+        if self.spam_evict_task:
+            self.spam_evict_task.cancel()
+        if self.blocklist_task:
+            self.blocklist_task.cancel()
+            
+    def get_metrics(self):
+        """Sizes of the in-memory automod structures, for the /metrics endpoint"""
+        return {
+            'automod_spam_tracked_users': len(self.spam_detector),
+            'automod_spam_evictions': self.spam_detector.evictions,
+            'automod_spam_triggers': self.spam_detector.triggers,
+            'automod_duplicate_fingerprints': len(self.duplicate_detector),
+            'automod_duplicate_triggers': self.duplicate_detector.triggers,
+            'automod_nsfw_matchers': len(self.nsfw_matchers),
+            'automod_cached_invites': len(self.invite_cache),
+            'automod_invite_cache_hits': self.invite_cache.hits,
+            'automod_invite_cache_misses': self.invite_cache.misses,
+            'automod_blocklist_domains': len(self.blocklist),
+            'automod_blocklist_reloads': self.blocklist.reloads
+        }
+    
+    def start_spam_evictor(self):
+        """Start the background task that drops idle spam windows and duplicate rings"""
+        if self.spam_evict_task is None or self.spam_evict_task.done():
+            self.spam_evict_task = asyncio.create_task(self.spam_evict_loop())
+            
+    def start_blocklist_watcher(self):
+        """Start the background task that loads the phishing blocklist and reloads it on change"""
+        if self.blocklist_task is None or self.blocklist_task.done():
+            self.blocklist_task = asyncio.create_task(self.blocklist_watch_loop())
+            
+    async def blocklist_watch_loop(self):
+        while not self.bot.is_closed():
+            try:
+                if await asyncio.to_thread(self.blocklist.reload):
+                    print(f"Loaded {len(self.blocklist):,} phishing domains from {self.blocklist.source_path}")
+            except Exception as e:
+                print(f"Error loading phishing blocklist: {e}")
+            await asyncio.sleep(BLOCKLIST_CHECK_INTERVAL)
+            
+    async def spam_evict_loop(self):
+        while not self.bot.is_closed():
+            await asyncio.sleep(SPAM_EVICT_INTERVAL)
+            self.spam_detector.evict()
+            self.duplicate_detector.evict()
         
     async def get_automod_settings(self, guild_id):
         """Get automod settings for a guild"""
@@ -66,6 +497,14 @@ class AutoMod(commands.Cog):
         if settings['spam_enabled']:
             await self.check_spam(message, settings)
             
+        # Check the same payload repeated across channels
+        if settings.get('duplicates_enabled', False):
+            await self.check_duplicates(message, settings)
+            
+        # Check links to known phishing domains
+        if settings.get('phishing_enabled', False):
+            await self.check_phishing(message, settings)
+            
         # Check discord links
         if settings['discord_links_enabled']:
             await self.check_discord_links(message)
@@ -76,22 +515,20 @@ class AutoMod(commands.Cog):
     
     async def check_spam(self, message, settings):
         """Check for spam messages"""
-        user_id = message.author.id
-        now = datetime.now()
-        
-        # Add current message to tracker
-        self.spam_tracker[user_id].append(now)
-        
-        # Check if user sent too many messages in time window
-        recent_messages = [
-            msg_time for msg_time in self.spam_tracker[user_id]
-            if now - msg_time <= timedelta(seconds=settings['spam_time'])
-        ]
-        
-        if len(recent_messages) >= settings['spam_messages']:
+        key = (message.guild.id, message.author.id)
+        burst = self.spam_detector.hit(
+            key, settings['spam_messages'], settings['spam_time'], (message.channel.id, message.id)
+        )
+        if burst:
             try:
-                # Delete the spam messages
-                await message.delete()
+                # Delete the whole burst on the next timer sweep, one bulk call per channel
+                by_channel = {}
+                for channel_id, message_id in burst:
+                    by_channel.setdefault(channel_id, []).append(message_id)
+                for channel_id, message_ids in by_channel.items():
+                    channel = message.guild.get_channel_or_thread(channel_id)
+                    if channel:
+                        await self.delete_later(channel, message_ids, 0)
                 
                 # Issue warning
                 if settings['warnings_enabled']:
@@ -105,77 +542,193 @@ class AutoMod(commands.Cog):
                 )
                 warning_msg = await message.channel.send(embed=embed)
                 
-                # Delete warning after 5 seconds
-                await asyncio.sleep(5)
-                try:
-                    await warning_msg.delete()
-                except:
-                    pass
+                # Delete warning after 5 seconds without holding this handler
+                await self.delete_later(message.channel, [warning_msg.id], NOTICE_LIFETIME)
                     
-                # Clear spam tracker for user
-                self.spam_tracker[user_id].clear()
-                
             except discord.Forbidden:
                 pass
             except Exception as e:
                 print(f"Error handling spam: {e}")
     
+    async def delete_later(self, channel, message_ids, delay):
+        """Hand messages to the timer service for deletion after delay seconds"""
+        timers = self.bot.get_cog('Timers')
+        if timers:
+            timers.delete_later(channel, message_ids, delay)
+            return
+        # Without the service the batch still goes out in bulk, after its own sleep
+        if delay > 0:
+            asyncio.create_task(self.delete_after(channel, message_ids, delay))
+        else:
+            await delete_message_ids(channel, message_ids)
+    
+    async def delete_after(self, channel, message_ids, delay):
+        await asyncio.sleep(delay)
+        try:
+            await delete_message_ids(channel, message_ids)
+        except discord.HTTPException as e:
+            print(f"Error deleting automod messages: {e}")
+    
+    async def check_duplicates(self, message, settings):
+        """Check for near-identical messages posted across several channels"""
+        if not self.duplicate_detector.check(
+            message.guild.id, message.author.id, message.channel.id, message.content
+        ):
+            return
+        try:
+            await message.delete()
+            
+            if settings['warnings_enabled']:
+                await self.add_warning(message.author, message.guild, "Cross-channel duplicate messages")
+                
+            embed = EmbedTemplates.warning(
+                "Duplicate Messages Detected",
+                f"{message.author.mention} please don't post the same message across channels!",
+                message.author
+            )
+            warning_msg = await message.channel.send(embed=embed)
+            
+            # Delete warning after 5 seconds without holding this handler
+            await self.delete_later(message.channel, [warning_msg.id], NOTICE_LIFETIME)
+                
+        except discord.Forbidden:
+            pass
+        except Exception as e:
+            print(f"Error handling duplicate messages: {e}")
+    
+    async def check_phishing(self, message, settings):
+        """Check for links to domains on the phishing blocklist"""
+        domain = self.blocklist.scan(message.content)
+        if not domain:
+            return
+        try:
+            await message.delete()
+            
+            if settings['warnings_enabled']:
+                await self.add_warning(message.author, message.guild, f"Phishing link ({domain})")
+                
+            embed = EmbedTemplates.warning(
+                "Scam Link Removed",
+                f"{message.author.mention} that link points to a known phishing or scam site!",
+                message.author
+            )
+            warning_msg = await message.channel.send(embed=embed)
+            
+            # Delete warning after 5 seconds without holding this handler
+            await self.delete_later(message.channel, [warning_msg.id], NOTICE_LIFETIME)
+            
+        except discord.Forbidden:
+            pass
+        except Exception as e:
+            print(f"Error handling phishing link: {e}")
+    
+    async def fetch_invite_guild(self, code):
+        """Resolve an invite code to its guild ID through the Discord API"""
+        try:
+            invite = await self.bot.fetch_invite(code, with_counts=False)
+        except discord.NotFound:
+            return None
+        return invite.guild.id if invite.guild else None
+    
+    async def get_invite_allowlist(self, guild_id):
+        """Get the guild IDs whose invites a guild allows, cached until the list is edited"""
+        allowlist = self.invite_allowlists.get(guild_id)
+        if allowlist is not None:
+            return allowlist
+        if not self.bot.db:
+            return frozenset()
+        try:
+            rows = await self.bot.db.fetch(
+                "SELECT target_guild_id FROM invite_allowlist WHERE guild_id = $1", guild_id
+            )
+        except Exception as e:
+            print(f"Error getting invite allowlist: {e}")
+            return frozenset()
+        allowlist = frozenset(row['target_guild_id'] for row in rows)
+        self.invite_allowlists[guild_id] = allowlist
+        return allowlist
+    
+    async def is_invite_allowed(self, guild, service, code):
+        """Whether an invite may stay up: it must resolve to this guild or an allowlisted one"""
+        if service:
+            # discord.io/me/li are third-party redirects with no resolvable code
+            return False
+        try:
+            target = await self.invite_cache.resolve(code)
+        except discord.HTTPException:
+            return False
+        if target is None:
+            return False
+        return target == guild.id or target in await self.get_invite_allowlist(guild.id)
+    
     async def check_discord_links(self, message):
         """Check for Discord invite links"""
-        if self.discord_link_pattern.search(message.content):
-            try:
-                await message.delete()
-                
-                embed = EmbedTemplates.warning(
-                    "Discord Link Removed",
-                    f"{message.author.mention} Discord invite links are not allowed!",
-                    message.author
-                )
-                warning_msg = await message.channel.send(embed=embed)
+        allowed = True
+        for service, code in invite_code_pattern.findall(message.content):
+            if not await self.is_invite_allowed(message.guild, service, code):
+                allowed = False
+                break
+        if allowed:
+            return
+            
+        try:
+            await message.delete()
+            
+            embed = EmbedTemplates.warning(
+                "Discord Link Removed",
+                f"{message.author.mention} Discord invite links are not allowed!",
+                message.author
+            )
+            warning_msg = await message.channel.send(embed=embed)
+            
+            # Delete warning after 5 seconds without holding this handler
+            await self.delete_later(message.channel, [warning_msg.id], NOTICE_LIFETIME)
                 
-                # Delete warning after 5 seconds
-                await asyncio.sleep(5)
-                try:
-                    await warning_msg.delete()
-                except:
-                    pass
-                    
-            except discord.Forbidden:
-                pass
-            except Exception as e:
-                print(f"Error handling discord link: {e}")
+        except discord.Forbidden:
+            pass
+        except Exception as e:
+            print(f"Error handling discord link: {e}")
+    
+    async def get_nsfw_keywords(self, guild_id):
+        """Get a guild's effective NSFW keywords as {keyword: whole_word}"""
+        keywords = dict(DEFAULT_NSFW_KEYWORDS)
+        if not self.bot.db:
+            return keywords
+        # Rows override the defaults: added words, changed modes and removed defaults
+        rows = await self.bot.db.fetch(
+            "SELECT keyword, whole_word, enabled FROM nsfw_keywords WHERE guild_id = $1", guild_id
+        )
+        for row in rows:
+            if row['enabled']:
+                keywords[row['keyword']] = row['whole_word']
+            else:
+                keywords.pop(row['keyword'], None)
+        return keywords
+    
+    async def get_nsfw_matcher(self, guild_id):
+        """Get a guild's compiled NSFW matcher, building it once per word list change"""
+        matcher = self.nsfw_matchers.get(guild_id)
+        if matcher is not None:
+            return matcher
+        try:
+            keywords = await self.get_nsfw_keywords(guild_id)
+        except Exception as e:
+            print(f"Error loading NSFW keywords: {e}")
+            return DEFAULT_NSFW_MATCHER
+        matcher = DEFAULT_NSFW_MATCHER if keywords == DEFAULT_NSFW_KEYWORDS else KeywordMatcher(keywords)
+        self.nsfw_matchers[guild_id] = matcher
+        return matcher
     
     async def check_nsfw_content(self, message, settings):
         """Check for NSFW content"""
-        # NSFW keywords to filter
-        nsfw_keywords = [
-            'sex', 'porn', 'nsfw', 'nude', 'naked', 'xxx', 'adult', 'erotic',
-            'sexual', 'penis', 'vagina', 'breast', 'boob', 'tit', 'ass', 'dick', 
-            'cock', 'pussy', 'fuck', 'shit', 'bitch', 'damn', 'orgasm', 
-            'masturbat', 'horny', 'aroused', 'kinky', 'fetish'
-        ]
-        
-        content_lower = message.content.lower()
-        is_nsfw = False
+        matcher = await self.get_nsfw_matcher(message.guild.id)
         
-        # Check message content for NSFW keywords
-        for keyword in nsfw_keywords:
-            if keyword in content_lower:
-                is_nsfw = True
-                break
+        # Content and attachment filenames go through the automaton in a single pass
+        text = message.content.lower()
+        if message.attachments:
+            text = "\n".join([text] + [attachment.filename.lower() for attachment in message.attachments])
         
-        # Check attachment filenames
-        if not is_nsfw and message.attachments:
-            for attachment in message.attachments:
-                filename_lower = attachment.filename.lower()
-                for keyword in nsfw_keywords:
-                    if keyword in filename_lower:
-                        is_nsfw = True
-                        break
-                if is_nsfw:
-                    break
-        
-        if is_nsfw:
+        if matcher.search(text):
             try:
                 # Delete the NSFW message
                 await message.delete()
@@ -192,12 +745,8 @@ class AutoMod(commands.Cog):
                 )
                 warning_msg = await message.channel.send(embed=embed)
                 
-                # Delete warning after 5 seconds
-                await asyncio.sleep(5)
-                try:
-                    await warning_msg.delete()
-                except:
-                    pass
+                # Delete warning after 5 seconds without holding this handler
+                await self.delete_later(message.channel, [warning_msg.id], NOTICE_LIFETIME)
                     
             except discord.Forbidden:
                 pass
@@ -209,95 +758,16 @@ class AutoMod(commands.Cog):
         if not self.bot.db:
             print(f"Cannot add warning - no database connection")
             return
+        escalation = self.bot.get_cog('Escalation')
+        if not escalation:
+            print("Cannot add warning - escalation is not loaded")
+            return
         try:
-            async with self.bot.db.acquire() as conn:
-                await conn.execute(
-                    """INSERT INTO warnings (guild_id, user_id, reason, moderator_id, warned_at)
-                       VALUES ($1, $2, $3, $4, $5)""",
-                    guild.id, user.id, reason, self.bot.user.id, datetime.now()
-                )
-                
-                # Get total warnings for user
-                warning_count = await conn.fetchval("""
-                    SELECT COUNT(*) FROM warnings 
-                    WHERE user_id = $1 AND guild_id = $2
-                """, user.id, guild.id)
-                
-                # Check for warning actions
-                action = await conn.fetchrow("""
-                    SELECT action_type, duration FROM warning_actions 
-                    WHERE guild_id = $1 AND warning_count = $2
-                """, guild.id, warning_count)
-                
-                if action:
-                    await self.execute_warning_action(user, guild, action, warning_count)
-                    
+            warning_id, warning_count, action = await escalation.issue_warning(user, guild, self.bot.user.id, reason)
+            await escalation.escalate(user, guild, action, warning_count)
         except Exception as e:
             print(f"Error adding warning: {e}")
     
-    async def execute_warning_action(self, user, guild, action, warning_count):
-        """Execute the configured action for reaching warning threshold"""
-        try:
-            action_type = action['action_type']
-            duration = action['duration']
-            
-            if action_type == 'mute':
-                # Get moderation cog to use mute functionality
-                mod_cog = self.bot.get_cog('Moderation')
-                if mod_cog:
-                    # Get or create muted role
-                    muted_role = discord.utils.get(guild.roles, name="Muted")
-                    if not muted_role:
-                        muted_role = await guild.create_role(
-                            name="Muted",
-                            color=discord.Color(0x818181),
-                            reason="Auto-created for warning actions"
-                        )
-                        
-                        # Set up permissions for the muted role
-                        for channel in guild.channels:
-                            try:
-                                if isinstance(channel, discord.TextChannel):
-                                    await channel.set_permissions(muted_role, send_messages=False, add_reactions=False)
-                                elif isinstance(channel, discord.VoiceChannel):
-                                    await channel.set_permissions(muted_role, speak=False, connect=False)
-                            except:
-                                continue
-                    
-                    member = guild.get_member(user.id)
-                    if member:
-                        # Parse duration and calculate unmute time
-                        unmute_time = None
-                        if duration and duration != 'permanent':
-                            time_delta = mod_cog.parse_time(duration)
-                            if time_delta:
-                                unmute_time = datetime.now() + time_delta
-                        
-                        # Add muted role
-                        await member.add_roles(muted_role, reason=f"Auto-mute: {warning_count} warnings")
-                        
-                        # Store in database
-                        await self.bot.db.execute("""
-                            INSERT INTO muted_users (user_id, guild_id, role_id, muted_at, unmute_at, reason, moderator_id)
-                            VALUES ($1, $2, $3, $4, $5, $6, $7)
-                            ON CONFLICT (user_id, guild_id) DO UPDATE SET
-                                role_id = $3, muted_at = $4, unmute_at = $5, reason = $6, moderator_id = $7
-                        """, member.id, guild.id, muted_role.id, datetime.now(), unmute_time, 
-                             f"Auto-mute: {warning_count} warnings", self.bot.user.id)
-                        
-            elif action_type == 'kick':
-                member = guild.get_member(user.id)
-                if member:
-                    await member.kick(reason=f"Auto-kick: {warning_count} warnings")
-                    
-            elif action_type == 'ban':
-                member = guild.get_member(user.id)
-                if member:
-                    await member.ban(reason=f"Auto-ban: {warning_count} warnings", delete_message_days=0)
-                    
-        except Exception as e:
-            print(f"Error executing warning action: {e}")
-    
     @commands.group(name='automod', invoke_without_command=True)
     @commands.has_permissions(manage_guild=True)
     async def automod(self, ctx):
@@ -329,6 +799,16 @@ class AutoMod(commands.Cog):
             value="✅ Enabled" if settings.get('nsfw_enabled', False) else "❌ Disabled",
             inline=True
         )
+        embed.add_field(
+            name="🎣 Phishing Links",
+            value="✅ Enabled" if settings.get('phishing_enabled', False) else "❌ Disabled",
+            inline=True
+        )
+        embed.add_field(
+            name="📋 Duplicate Detection",
+            value="✅ Enabled" if settings.get('duplicates_enabled', False) else "❌ Disabled",
+            inline=True
+        )
         
         if settings['spam_enabled']:
             embed.add_field(
@@ -345,8 +825,12 @@ class AutoMod(commands.Cog):
             name="🔧 Commands",
             value=f"`{prefix}automod warnings` - Toggle auto warnings\n"
                   f"`{prefix}automod links` - Toggle Discord link blocking\n"
+                  f"`{prefix}automod invites` - Servers whose invites are allowed\n"
                   f"`{prefix}automod spam` - Toggle spam detection\n"
-                  f"`{prefix}automod spam-config <messages> <seconds>` - Configure spam settings",
+                  f"`{prefix}automod duplicates` - Toggle cross-channel duplicate detection\n"
+                  f"`{prefix}automod phishing` - Toggle phishing link removal\n"
+                  f"`{prefix}automod spam-config <messages> <seconds>` - Configure spam settings\n"
+                  f"`{prefix}automod nsfw add|remove <word>` - Edit the NSFW word list",
             inline=False
         )
         
@@ -471,6 +955,9 @@ class AutoMod(commands.Cog):
                     ON CONFLICT (guild_id, warning_count) DO UPDATE SET
                         action_type = $3, duration = $4
                 """, ctx.guild.id, warnings, action, duration or 'permanent')
+                escalation = self.bot.get_cog('Escalation')
+                if escalation:
+                    escalation.invalidate_warning_ladder(ctx.guild.id)
                 
                 duration_text = f" for {duration}" if duration and action == 'mute' else ""
                 embed = EmbedTemplates.success(
@@ -494,6 +981,9 @@ class AutoMod(commands.Cog):
                     DELETE FROM warning_actions 
                     WHERE guild_id = $1 AND warning_count = $2
                 """, ctx.guild.id, warnings)
+                escalation = self.bot.get_cog('Escalation')
+                if escalation:
+                    escalation.invalidate_warning_ladder(ctx.guild.id)
                 
                 if result == "DELETE 0":
                     embed = EmbedTemplates.error(
@@ -571,7 +1061,165 @@ class AutoMod(commands.Cog):
             embed = EmbedTemplates.error("Database Error", "Failed to update settings.", ctx.author)
             await ctx.send(embed=embed)
     
-    @automod.command(name='nsfw')
+    @automod.group(name='invites', invoke_without_command=True)
+    @commands.has_permissions(manage_guild=True)
+    async def invite_allowlist(self, ctx):
+        """Show the servers whose invites may be posted here"""
+        allowlist = await self.get_invite_allowlist(ctx.guild.id)
+        prefix = await self.bot.get_prefix(ctx.message)
+        if isinstance(prefix, list):
+            prefix = prefix[0]
+            
+        embed = discord.Embed(
+            title="🔗 Invite Allowlist",
+            description="Invites to this server are always allowed. Invites to these servers are allowed too:",
+            color=0x5865f2
+        )
+        if allowlist:
+            lines = []
+            for guild_id in sorted(allowlist):
+                guild = self.bot.get_guild(guild_id)
+                lines.append(f"**{guild.name}** ({guild_id})" if guild else f"`{guild_id}`")
+            embed.add_field(name="Allowed Servers", value="\n".join(lines)[:1024], inline=False)
+        else:
+            embed.add_field(name="Allowed Servers", value="No other servers allowed", inline=False)
+        embed.add_field(
+            name="🔧 Commands",
+            value=f"`{prefix}automod invites add <invite or server ID>` - Allow a server's invites\n"
+                  f"`{prefix}automod invites remove <server ID>` - Stop allowing a server's invites",
+            inline=False
+        )
+        embed.set_footer(text=f"Requested by {ctx.author.display_name}")
+        await ctx.send(embed=embed)
+    
+    @invite_allowlist.command(name='add')
+    @commands.has_permissions(manage_guild=True)
+    async def add_invite_allowlist(self, ctx, target: str):
+        """Allow invites to a server, given one of its invites or its ID"""
+        if target.isdigit():
+            target_guild_id = int(target)
+        else:
+            match = invite_code_pattern.search(target)
+            code = match.group(2) if match else target
+            try:
+                target_guild_id = await self.invite_cache.resolve(code)
+            except discord.HTTPException:
+                target_guild_id = None
+            if target_guild_id is None:
+                embed = EmbedTemplates.error(
+                    "Invalid Invite",
+                    "That invite doesn't exist or has expired. You can also use the server's ID.",
+                    ctx.author
+                )
+                await ctx.send(embed=embed)
+                return
+                
+        try:
+            await self.bot.db.execute("""
+                INSERT INTO invite_allowlist (guild_id, target_guild_id) VALUES ($1, $2)
+                ON CONFLICT DO NOTHING
+            """, ctx.guild.id, target_guild_id)
+            self.invite_allowlists.pop(ctx.guild.id, None)
+            
+            embed = EmbedTemplates.success(
+                "Invite Allowlist Updated",
+                f"Invites to server `{target_guild_id}` are now allowed!",
+                ctx.author
+            )
+            await ctx.send(embed=embed)
+            
+        except Exception as e:
+            embed = EmbedTemplates.error("Database Error", "Failed to update the allowlist.", ctx.author)
+            await ctx.send(embed=embed)
+    
+    @invite_allowlist.command(name='remove')
+    @commands.has_permissions(manage_guild=True)
+    async def remove_invite_allowlist(self, ctx, target_guild_id: int):
+        """Stop allowing invites to a server"""
+        try:
+            result = await self.bot.db.execute(
+                "DELETE FROM invite_allowlist WHERE guild_id = $1 AND target_guild_id = $2",
+                ctx.guild.id, target_guild_id
+            )
+            self.invite_allowlists.pop(ctx.guild.id, None)
+            
+            if result == "DELETE 0":
+                embed = EmbedTemplates.error(
+                    "Server Not Found",
+                    f"Server `{target_guild_id}` is not on the allowlist.",
+                    ctx.author
+                )
+            else:
+                embed = EmbedTemplates.success(
+                    "Invite Allowlist Updated",
+                    f"Invites to server `{target_guild_id}` are no longer allowed!",
+                    ctx.author
+                )
+            await ctx.send(embed=embed)
+            
+        except Exception as e:
+            embed = EmbedTemplates.error("Database Error", "Failed to update the allowlist.", ctx.author)
+            await ctx.send(embed=embed)
+    
+    @automod.command(name='phishing')
+    @commands.has_permissions(manage_guild=True)
+    async def toggle_phishing(self, ctx):
+        """Toggle removal of links to known phishing domains"""
+        try:
+            async with self.bot.db.acquire() as conn:
+                current = await conn.fetchval(
+                    "SELECT phishing_enabled FROM automod_settings WHERE guild_id = $1", ctx.guild.id
+                )
+                new_state = not current if current is not None else True
+                
+                await conn.execute(
+                    """INSERT INTO automod_settings (guild_id, phishing_enabled) VALUES ($1, $2)
+                       ON CONFLICT (guild_id) DO UPDATE SET phishing_enabled = $2""",
+                    ctx.guild.id, new_state
+                )
+                
+                status = "enabled" if new_state else "disabled"
+                embed = EmbedTemplates.success(
+                    "Phishing Protection Updated",
+                    f"Phishing link removal has been **{status}**! ({len(self.blocklist):,} domains listed)",
+                    ctx.author
+                )
+                await ctx.send(embed=embed)
+                
+        except Exception as e:
+            embed = EmbedTemplates.error("Database Error", "Failed to update settings.", ctx.author)
+            await ctx.send(embed=embed)
+    
+    @automod.command(name='duplicates')
+    @commands.has_permissions(manage_guild=True)
+    async def toggle_duplicates(self, ctx):
+        """Toggle cross-channel duplicate message detection"""
+        try:
+            async with self.bot.db.acquire() as conn:
+                current = await conn.fetchval(
+                    "SELECT duplicates_enabled FROM automod_settings WHERE guild_id = $1", ctx.guild.id
+                )
+                new_state = not current if current is not None else True
+                
+                await conn.execute(
+                    """INSERT INTO automod_settings (guild_id, duplicates_enabled) VALUES ($1, $2)
+                       ON CONFLICT (guild_id) DO UPDATE SET duplicates_enabled = $2""",
+                    ctx.guild.id, new_state
+                )
+                
+                status = "enabled" if new_state else "disabled"
+                embed = EmbedTemplates.success(
+                    "Duplicate Detection Updated",
+                    f"Cross-channel duplicate detection has been **{status}**!",
+                    ctx.author
+                )
+                await ctx.send(embed=embed)
+                
+        except Exception as e:
+            embed = EmbedTemplates.error("Database Error", "Failed to update settings.", ctx.author)
+            await ctx.send(embed=embed)
+    
+    @automod.group(name='nsfw', invoke_without_command=True)
     @commands.has_permissions(manage_guild=True)
     async def toggle_nsfw(self, ctx):
         """Toggle NSFW content filtering"""
@@ -600,6 +1248,119 @@ class AutoMod(commands.Cog):
             embed = EmbedTemplates.error("Database Error", "Failed to update settings.", ctx.author)
             await ctx.send(embed=embed)
     
+    @toggle_nsfw.command(name='add')
+    @commands.has_permissions(manage_guild=True)
+    async def add_nsfw_keyword(self, ctx, keyword: str, mode: str = 'word'):
+        """Filter a word, either as a whole word or anywhere it appears"""
+        keyword = keyword.lower()
+        mode = mode.lower()
+        if mode not in ('word', 'substring'):
+            embed = EmbedTemplates.error(
+                "Invalid Mode",
+                "Mode must be `word` (whole words only) or `substring` (anywhere in a word)",
+                ctx.author
+            )
+            await ctx.send(embed=embed)
+            return
+        if len(keyword) > 50:
+            embed = EmbedTemplates.error(
+                "Invalid Word",
+                "Words must be 50 characters or fewer!",
+                ctx.author
+            )
+            await ctx.send(embed=embed)
+            return
+            
+        try:
+            await self.bot.db.execute("""
+                INSERT INTO nsfw_keywords (guild_id, keyword, whole_word, enabled)
+                VALUES ($1, $2, $3, TRUE)
+                ON CONFLICT (guild_id, keyword) DO UPDATE SET whole_word = $3, enabled = TRUE
+            """, ctx.guild.id, keyword, mode == 'word')
+            self.nsfw_matchers.pop(ctx.guild.id, None)
+            
+            embed = EmbedTemplates.success(
+                "NSFW Word Added",
+                f"`{keyword}` will now be filtered {'as a whole word' if mode == 'word' else 'anywhere it appears'}!",
+                ctx.author
+            )
+            await ctx.send(embed=embed)
+            
+        except Exception as e:
+            embed = EmbedTemplates.error("Database Error", "Failed to add word.", ctx.author)
+            await ctx.send(embed=embed)
+    
+    @toggle_nsfw.command(name='remove')
+    @commands.has_permissions(manage_guild=True)
+    async def remove_nsfw_keyword(self, ctx, keyword: str):
+        """Stop filtering a word, including one from the default list"""
+        keyword = keyword.lower()
+        try:
+            keywords = await self.get_nsfw_keywords(ctx.guild.id)
+            if keyword not in keywords:
+                embed = EmbedTemplates.error(
+                    "Word Not Found",
+                    f"`{keyword}` is not on this server's NSFW word list.",
+                    ctx.author
+                )
+                await ctx.send(embed=embed)
+                return
+                
+            if keyword in DEFAULT_NSFW_KEYWORDS:
+                # Defaults are switched off with a row rather than deleted
+                await self.bot.db.execute("""
+                    INSERT INTO nsfw_keywords (guild_id, keyword, whole_word, enabled)
+                    VALUES ($1, $2, $3, FALSE)
+                    ON CONFLICT (guild_id, keyword) DO UPDATE SET enabled = FALSE
+                """, ctx.guild.id, keyword, DEFAULT_NSFW_KEYWORDS[keyword])
+            else:
+                await self.bot.db.execute(
+                    "DELETE FROM nsfw_keywords WHERE guild_id = $1 AND keyword = $2", ctx.guild.id, keyword
+                )
+            self.nsfw_matchers.pop(ctx.guild.id, None)
+            
+            embed = EmbedTemplates.success(
+                "NSFW Word Removed",
+                f"`{keyword}` is no longer filtered!",
+                ctx.author
+            )
+            await ctx.send(embed=embed)
+            
+        except Exception as e:
+            embed = EmbedTemplates.error("Database Error", "Failed to remove word.", ctx.author)
+            await ctx.send(embed=embed)
+    
+    @toggle_nsfw.command(name='words', aliases=['list'])
+    @commands.has_permissions(manage_guild=True)
+    async def list_nsfw_keywords(self, ctx):
+        """Show the words this server filters"""
+        try:
+            keywords = await self.get_nsfw_keywords(ctx.guild.id)
+        except Exception as e:
+            embed = EmbedTemplates.error("Database Error", "Failed to load word list.", ctx.author)
+            await ctx.send(embed=embed)
+            return
+            
+        whole_words = sorted(keyword for keyword, whole_word in keywords.items() if whole_word)
+        substrings = sorted(keyword for keyword, whole_word in keywords.items() if not whole_word)
+        embed = discord.Embed(
+            title="🔞 NSFW Word List",
+            description=f"**{len(keywords)}** words are filtered in this server.",
+            color=0x5865f2
+        )
+        embed.add_field(
+            name="Whole Words",
+            value=", ".join(f"`{keyword}`" for keyword in whole_words)[:1024] or "None",
+            inline=False
+        )
+        embed.add_field(
+            name="Anywhere in a Word",
+            value=", ".join(f"`{keyword}`" for keyword in substrings)[:1024] or "None",
+            inline=False
+        )
+        embed.set_footer(text=f"Requested by {ctx.author.display_name}")
+        await ctx.send(embed=embed)
+    
     @automod.command(name='spam-config')
     @commands.has_permissions(manage_guild=True)
     async def configure_spam(self, ctx, messages: int = None, seconds: int = None):
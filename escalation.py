@@ -0,0 +1,124 @@
+import discord
+from discord.ext import commands
+from datetime import datetime
+
+class Escalation(commands.Cog):
+    """Stores warnings and runs the guild's escalation ladder for every cog that issues them"""
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.warning_ladders = {}  # guild_id: {warning_count: action}, dropped when actions change
+
+    def get_metrics(self):
+        """Sizes of the ladder cache, for the /metrics endpoint"""
+        return {
+            'escalation_warning_ladders': len(self.warning_ladders)
+        }
+
+    def invalidate_warning_ladder(self, guild_id):
+        """Drop a guild's cached ladder after its warning actions change"""
+        self.warning_ladders.pop(guild_id, None)
+
+    async def get_warning_ladder(self, guild_id):
+        """Get a guild's escalation ladder as {warning_count: action}, cached until it is edited"""
+        ladder = self.warning_ladders.get(guild_id)
+        if ladder is not None:
+            return ladder
+        rows = await self.bot.db.fetch(
+            "SELECT warning_count, action_type, duration FROM warning_actions WHERE guild_id = $1", guild_id
+        )
+        ladder = {
+            row['warning_count']: {'action_type': row['action_type'], 'duration': row['duration']}
+            for row in rows
+        }
+        self.warning_ladders[guild_id] = ladder
+        return ladder
+    
+    async def issue_warning(self, user, guild, moderator_id, reason):
+        """Store a warning; returns (warning_id, warning_count, action or None).
+        
+        Used by both automod and the warn command, which then call escalate().
+        """
+        # One round trip: the count runs on the snapshot before the insert, hence the + 1
+        row = await self.bot.db.fetchrow("""
+            WITH inserted AS (
+                INSERT INTO warnings (user_id, guild_id, moderator_id, reason)
+                VALUES ($1, $2, $3, $4)
+                RETURNING id
+            )
+            SELECT (SELECT id FROM inserted) AS id,
+                   (SELECT COUNT(*) FROM warnings WHERE user_id = $1 AND guild_id = $2) + 1 AS warning_count
+        """, user.id, guild.id, moderator_id, reason)
+        ladder = await self.get_warning_ladder(guild.id)
+        return row['id'], row['warning_count'], ladder.get(row['warning_count'])
+    
+    async def escalate(self, user, guild, action, warning_count):
+        """Run the ladder action a warning reached, if any"""
+        if action:
+            await self.execute_warning_action(user, guild, action, warning_count)
+    
+    async def execute_warning_action(self, user, guild, action, warning_count):
+        """Execute the configured action for reaching warning threshold"""
+        try:
+            action_type = action['action_type']
+            duration = action['duration']
+            
+            if action_type == 'mute':
+                # Get moderation cog to use mute functionality
+                mod_cog = self.bot.get_cog('Moderation')
+                if mod_cog:
+                    # Get or create muted role
+                    muted_role = discord.utils.get(guild.roles, name="Muted")
+                    if not muted_role:
+                        muted_role = await guild.create_role(
+                            name="Muted",
+                            color=discord.Color(0x818181),
+                            reason="Auto-created for warning actions"
+                        )
+                        
+                        # Set up permissions for the muted role
+                        for channel in guild.channels:
+                            try:
+                                if isinstance(channel, discord.TextChannel):
+                                    await channel.set_permissions(muted_role, send_messages=False, add_reactions=False)
+                                elif isinstance(channel, discord.VoiceChannel):
+                                    await channel.set_permissions(muted_role, speak=False, connect=False)
+                            except:
+                                continue
+                    
+                    member = guild.get_member(user.id)
+                    if member:
+                        # Parse duration and calculate unmute time
+                        unmute_time = None
+                        if duration and duration != 'permanent':
+                            time_delta = mod_cog.parse_time(duration)
+                            if time_delta:
+                                unmute_time = datetime.now() + time_delta
+                        
+                        # Add muted role
+                        await member.add_roles(muted_role, reason=f"Auto-mute: {warning_count} warnings")
+                        
+                        # Store in database
+                        await self.bot.db.execute("""
+                            INSERT INTO muted_users (user_id, guild_id, role_id, muted_at, unmute_at, reason, moderator_id)
+                            VALUES ($1, $2, $3, $4, $5, $6, $7)
+                            ON CONFLICT (user_id, guild_id) DO UPDATE SET
+                                role_id = $3, muted_at = $4, unmute_at = $5, reason = $6, moderator_id = $7
+                        """, member.id, guild.id, muted_role.id, datetime.now(), unmute_time, 
+                             f"Auto-mute: {warning_count} warnings", self.bot.user.id)
+                        
+            elif action_type == 'kick':
+                member = guild.get_member(user.id)
+                if member:
+                    await member.kick(reason=f"Auto-kick: {warning_count} warnings")
+                    
+            elif action_type == 'ban':
+                member = guild.get_member(user.id)
+                if member:
+                    await member.ban(reason=f"Auto-ban: {warning_count} warnings", delete_message_days=0)
+                    
+        except Exception as e:
+            print(f"Error executing warning action: {e}")
+
+async def setup(bot):
+    await bot.add_cog(Escalation(bot))
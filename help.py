@@ -66,6 +66,11 @@ class HelpMenu(discord.ui.View):
                 value="Display bot information",
                 inline=False
             )
+            embed.add_field(
+                name=f"`{await self.get_prefix(interaction)}serverstats`",
+                value="Show message activity per hour, day and channel for the last 30 days",
+                inline=False
+            )
             
         elif category == "Moderation":
             embed = discord.Embed(
@@ -113,6 +118,26 @@ class HelpMenu(discord.ui.View):
                 value="Set automatic punishment for warning count (mute 5m, kick, ban)",
                 inline=False
             )
+            embed.add_field(
+                name=f"`{await self.get_prefix(interaction)}automod invites [add|remove] <invite or server ID>`",
+                value="Allow invites to partner servers while Discord link blocking is on",
+                inline=False
+            )
+            embed.add_field(
+                name=f"`{await self.get_prefix(interaction)}automod phishing`",
+                value="Toggle removal of links to known phishing and scam domains",
+                inline=False
+            )
+            embed.add_field(
+                name=f"`{await self.get_prefix(interaction)}automod duplicates`",
+                value="Toggle removal of the same message posted across several channels",
+                inline=False
+            )
+            embed.add_field(
+                name=f"`{await self.get_prefix(interaction)}automod nsfw add|remove <word> [word|substring]`",
+                value="Edit this server's NSFW word list, matching whole words or anywhere in a word",
+                inline=False
+            )
             embed.add_field(
                 name=f"`{await self.get_prefix(interaction)}welcome`",
                 value="Configure welcome/leave messages (Admin only)",
@@ -141,8 +166,13 @@ class HelpMenu(discord.ui.View):
                 inline=False
             )
             embed.add_field(
-                name=f"`{await self.get_prefix(interaction)}leaderboard`",
-                value="View the server leaderboard",
+                name=f"`{await self.get_prefix(interaction)}rankcard [user]`",
+                value="Show an image rank card with avatar and progress bar",
+                inline=False
+            )
+            embed.add_field(
+                name=f"`{await self.get_prefix(interaction)}leaderboard [me|global|season:<n>]`",
+                value="View the server leaderboard, the members ranked around you, the cross-server leaderboard, or a past season",
                 inline=False
             )
             embed.add_field(
@@ -150,6 +180,41 @@ class HelpMenu(discord.ui.View):
                 value="Toggle leveling system on/off (Admin only)",
                 inline=False
             )
+            embed.add_field(
+                name=f"`{await self.get_prefix(interaction)}levelup [here|dm|off|#channel]`",
+                value="Choose where level-up announcements go (Admin only)",
+                inline=False
+            )
+            embed.add_field(
+                name=f"`{await self.get_prefix(interaction)}xpcooldown [seconds]`",
+                value="View or change the wait between XP-earning messages (Admin only)",
+                inline=False
+            )
+            embed.add_field(
+                name=f"`{await self.get_prefix(interaction)}levelcurve [base] [growth]`",
+                value="View or change how much XP each level costs (Admin only)",
+                inline=False
+            )
+            embed.add_field(
+                name=f"`{await self.get_prefix(interaction)}xprules`",
+                value="Set XP per message, no-XP channels and XP multipliers (Admin only)",
+                inline=False
+            )
+            embed.add_field(
+                name=f"`{await self.get_prefix(interaction)}levelrewards`",
+                value="Give roles to members when they reach a level (Admin only)",
+                inline=False
+            )
+            embed.add_field(
+                name=f"`{await self.get_prefix(interaction)}endseason confirm`",
+                value="Archive the leaderboard and start a new season (Admin only)",
+                inline=False
+            )
+            embed.add_field(
+                name=f"`{await self.get_prefix(interaction)}levelimport` / `{await self.get_prefix(interaction)}levelexport`",
+                value="Import XP from a CSV/JSON file or export it (Admin only)",
+                inline=False
+            )
             
         elif category == "Games":
             embed = discord.Embed(
@@ -238,7 +303,7 @@ class HelpMenu(discord.ui.View):
             )
             embed.add_field(
                 name="**💬 General**",
-                value=f"`{await self.get_prefix(interaction)}help`, `{await self.get_prefix(interaction)}ping`, `{await self.get_prefix(interaction)}info`",
+                value=f"`{await self.get_prefix(interaction)}help`, `{await self.get_prefix(interaction)}ping`, `{await self.get_prefix(interaction)}info`, `{await self.get_prefix(interaction)}serverstats`",
                 inline=False
             )
             embed.add_field(
@@ -248,7 +313,7 @@ class HelpMenu(discord.ui.View):
             )
             embed.add_field(
                 name="**🛡️ Auto-Moderation**",
-                value=f"`{await self.get_prefix(interaction)}automod`, `{await self.get_prefix(interaction)}automod spam`, `{await self.get_prefix(interaction)}automod links`, `{await self.get_prefix(interaction)}automod nsfw`, `{await self.get_prefix(interaction)}automod warnings`, `{await self.get_prefix(interaction)}automod action`",
+                value=f"`{await self.get_prefix(interaction)}automod`, `{await self.get_prefix(interaction)}automod spam`, `{await self.get_prefix(interaction)}automod links`, `{await self.get_prefix(interaction)}automod invites`, `{await self.get_prefix(interaction)}automod nsfw`, `{await self.get_prefix(interaction)}automod duplicates`, `{await self.get_prefix(interaction)}automod phishing`, `{await self.get_prefix(interaction)}automod warnings`, `{await self.get_prefix(interaction)}automod action`",
                 inline=False
             )
             embed.add_field(
@@ -258,7 +323,7 @@ class HelpMenu(discord.ui.View):
             )
             embed.add_field(
                 name="**📊 Leveling**",
-                value=f"`{await self.get_prefix(interaction)}rank`, `{await self.get_prefix(interaction)}leaderboard`, `{await self.get_prefix(interaction)}leveling`",
+                value=f"`{await self.get_prefix(interaction)}rank`, `{await self.get_prefix(interaction)}rankcard`, `{await self.get_prefix(interaction)}leaderboard`, `{await self.get_prefix(interaction)}leveling`, `{await self.get_prefix(interaction)}levelup`, `{await self.get_prefix(interaction)}xpcooldown`, `{await self.get_prefix(interaction)}levelcurve`, `{await self.get_prefix(interaction)}endseason`, `{await self.get_prefix(interaction)}levelrewards`, `{await self.get_prefix(interaction)}xprules`",
                 inline=False
             )
             embed.add_field(
@@ -1,95 +1,1404 @@
 import discord
 from discord.ext import commands
 import random
+import asyncio
+import asyncpg
+import argparse
+import bisect
+import csv
+import functools
+import gzip
+import io
+import math
+import json
+import os
+import tempfile
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from dotenv import load_dotenv
 from utils.embeds import EmbedTemplates
+from cogs.names import resolve_names
 from datetime import datetime
 
+try:
+    from PIL import Image, ImageDraw, ImageFont
+except ImportError:
+    Image = None  # Rank cards fall back to the text embed
+
+XP_FLUSH_INTERVAL = 5  # seconds between write-behind flushes
+XP_CACHE_IDLE = 900  # seconds before an idle user's cached stats are dropped
+MAX_LEVEL = 1000  # levels covered by a compiled curve's table; higher levels are solved directly
+LEADERBOARD_PAGE_SIZE = 10
+MAX_XP_COOLDOWN = 3600  # longest per-guild XP cooldown, in seconds
+LEADERBOARD_CACHE_TTL = 600  # seconds before a cached top page is re-rendered to pick up name changes
+LEVELUP_BATCH_WINDOW = 3  # seconds to gather level-ups for one destination before announcing
+LEVELUP_QUEUE_LIMIT = 500  # announcements held at once; extra ones are dropped
+IMPORT_BATCH_SIZE = 5000  # rows sent per COPY during bulk imports
+RANK_CACHE_TTL = 30  # seconds a .rank lookup is reused when the guild has no rank index yet
+VOICE_XP_TICK = 60  # seconds between voice XP awards
+VOICE_XP_PER_TICK = 10  # XP for each full tick spent in an eligible voice channel
+ROLE_GRANT_INTERVAL = 1.0  # seconds between role edits, to stay well inside Discord's rate limits
+RANK_CARD_WORKERS = 2  # processes used to render rank cards
+AVATAR_CACHE_SIZE = 256  # avatars kept in memory, keyed by avatar hash
+RANK_CARD_CACHE_SIZE = 512  # rendered cards kept in memory
+
+class XPRules:
+    """A guild's XP rules compiled into sets and dicts so checking a message is a few hash lookups"""
+    __slots__ = ('no_xp_channels', 'channel_multipliers', 'role_multipliers', 'xp_min', 'xp_max')
+    
+    def __init__(self, rows=(), xp_min=15, xp_max=25):
+        no_xp_channels = set()
+        channel_multipliers = {}
+        role_multipliers = {}
+        for rule_type, target_id, multiplier in rows:
+            if rule_type == 'no_xp_channel':
+                no_xp_channels.add(target_id)
+            elif rule_type == 'channel_multiplier':
+                channel_multipliers[target_id] = multiplier
+            elif rule_type == 'role_multiplier':
+                role_multipliers[target_id] = multiplier
+        self.no_xp_channels = frozenset(no_xp_channels)
+        self.channel_multipliers = channel_multipliers
+        self.role_multipliers = role_multipliers
+        self.xp_min = xp_min
+        self.xp_max = xp_max
+        
+    def multiplier_for(self, channel, member):
+        """XP multiplier for a member's activity in a channel, or None if it's a no-XP channel"""
+        # Threads follow their parent channel, and channels follow their category
+        scopes = (channel.id, getattr(channel, 'parent_id', None), getattr(channel, 'category_id', None))
+        if any(scope in self.no_xp_channels for scope in scopes):
+            return None
+        multiplier = 1.0
+        for scope in scopes:
+            if scope in self.channel_multipliers:
+                multiplier = self.channel_multipliers[scope]
+                break
+        if self.role_multipliers:
+            # Members get their best role multiplier
+            role_multiplier = max(
+                (value for role_id, value in self.role_multipliers.items() if member.get_role(role_id)),
+                default=1.0
+            )
+            multiplier *= role_multiplier
+        return multiplier
+        
+    def xp_for(self, message):
+        """XP a message earns, or 0 if it's in a no-XP channel"""
+        multiplier = self.multiplier_for(message.channel, message.author)
+        if multiplier is None:
+            return 0
+        return max(1, round(random.randint(self.xp_min, self.xp_max) * multiplier))
+
+class RoleGrantQueue:
+    """Merges pending reward roles per member so each member gets a single add_roles call"""
+    def __init__(self, interval=ROLE_GRANT_INTERVAL):
+        self.interval = interval
+        self.pending = OrderedDict()  # (guild_id, member_id): set of role IDs
+        self.edits = 0
+        
+    def __len__(self):
+        return len(self.pending)
+    
+    def queue(self, guild_id, member_id, role_ids):
+        roles = self.pending.get((guild_id, member_id))
+        if roles is None:
+            self.pending[(guild_id, member_id)] = set(role_ids)
+        else:
+            roles.update(role_ids)
+            
+    async def run(self, bot):
+        """Apply queued grants one member at a time, spaced out by the interval"""
+        while not bot.is_closed():
+            if not self.pending:
+                await asyncio.sleep(self.interval)
+                continue
+            (guild_id, member_id), role_ids = self.pending.popitem(last=False)
+            guild = bot.get_guild(guild_id)
+            member = guild.get_member(member_id) if guild else None
+            if member is None:
+                continue
+            roles = [guild.get_role(role_id) for role_id in role_ids if member.get_role(role_id) is None]
+            roles = [role for role in roles if role is not None]
+            if not roles:
+                continue
+            try:
+                await member.add_roles(*roles, reason="Level reward")
+                self.edits += 1
+            except discord.HTTPException as e:
+                print(f"Error granting level rewards: {e}")
+            await asyncio.sleep(self.interval)
+
+def load_card_font(size):
+    try:
+        return ImageFont.truetype("DejaVuSans.ttf", size)
+    except OSError:
+        return ImageFont.load_default()
+
+def render_rank_card(avatar_bytes, name, level, rank, xp_into_level, xp_for_level, total_xp):
+    """Draw a rank card and return it as PNG bytes; runs in a worker process"""
+    card = Image.new('RGBA', (900, 250), (35, 39, 42, 255))
+    draw = ImageDraw.Draw(card)
+    
+    if avatar_bytes:
+        avatar = Image.open(io.BytesIO(avatar_bytes)).convert('RGBA').resize((180, 180))
+        mask = Image.new('L', (180, 180), 0)
+        ImageDraw.Draw(mask).ellipse((0, 0, 180, 180), fill=255)
+        card.paste(avatar, (35, 35), mask)
+        
+    draw.text((250, 45), name[:24], font=load_card_font(40), fill=(255, 255, 255))
+    draw.text((250, 105), f"Rank #{rank}   Level {level}", font=load_card_font(30), fill=(255, 215, 0))
+    
+    # Progress bar towards the next level
+    progress = min(1.0, xp_into_level / xp_for_level) if xp_for_level else 1.0
+    draw.rounded_rectangle((250, 160, 860, 195), radius=17, fill=(72, 75, 78))
+    if progress > 0:
+        draw.rounded_rectangle((250, 160, 250 + int(610 * progress), 195), radius=17, fill=(78, 205, 196))
+    draw.text((250, 205), f"{xp_into_level:,} / {xp_for_level:,} XP • {total_xp:,} total",
+              font=load_card_font(22), fill=(185, 187, 190))
+    
+    buffer = io.BytesIO()
+    card.save(buffer, 'PNG')
+    return buffer.getvalue()
+
+class LevelUpAnnouncer:
+    """Buffers level-up announcements per destination and sends each batch as one embed.
+    
+    A destination gets at most one message per window, which keeps busy
+    channels clear of Discord's per-channel rate limits.
+    """
+    def __init__(self, window=LEVELUP_BATCH_WINDOW, limit=LEVELUP_QUEUE_LIMIT):
+        self.window = window
+        self.limit = limit
+        self.pending = {}  # destination id: (destination, {user_id: (member, level, xp)})
+        self.tasks = {}  # destination id: sender task
+        self.queued = 0
+        self.dropped = 0
+        
+    def queue(self, destination, member, level, xp):
+        key = destination.id
+        batch = self.pending.get(key)
+        if batch is None or member.id not in batch[1]:
+            if self.queued >= self.limit:
+                self.dropped += 1
+                return
+            self.queued += 1
+        if batch is None:
+            batch = (destination, {})
+            self.pending[key] = batch
+        # A member who levels twice within the window is announced once, at the higher level
+        batch[1][member.id] = (member, level, xp)
+        if key not in self.tasks:
+            self.tasks[key] = asyncio.create_task(self.send_later(key))
+            
+    async def send_later(self, key):
+        try:
+            await asyncio.sleep(self.window)
+        finally:
+            self.tasks.pop(key, None)
+        destination, members = self.pending.pop(key)
+        self.queued -= len(members)
+        entries = sorted(members.values(), key=lambda entry: entry[1], reverse=True)
+        
+        if len(entries) == 1:
+            member, level, xp = entries[0]
+            embed = EmbedTemplates.level_up(member, level, xp)
+        else:
+            lines = [f"{member.mention} reached **Level {level}**" for member, level, xp in entries[:20]]
+            if len(entries) > 20:
+                lines.append(f"...and {len(entries) - 20} more!")
+            embed = discord.Embed(
+                title=f"🎉 {len(entries)} members leveled up!",
+                description="\n".join(lines),
+                color=0xffd700,
+                timestamp=datetime.now()
+            )
+        try:
+            await destination.send(embed=embed)
+        except discord.HTTPException:
+            pass  # Missing permissions or DMs disabled
+        
+    def cancel(self):
+        for task in self.tasks.values():
+            task.cancel()
+
+class CooldownWheel:
+    """Expiring cooldowns stored in a timing wheel with one slot per second.
+    
+    Each key sits in the slot for the second after it expires. Advancing the
+    wheel sweeps only the slots that have passed, so eviction is O(1) amortized.
+    """
+    def __init__(self, max_cooldown=MAX_XP_COOLDOWN):
+        self.max_cooldown = max_cooldown
+        self.size = max_cooldown + 2
+        self.slots = [None] * self.size
+        self.expires = {}  # key: monotonic expiry time
+        self.cursor = None  # last whole second swept
+        
+    def __len__(self):
+        return len(self.expires)
+    
+    def _advance(self, now):
+        second = int(now)
+        if self.cursor is None:
+            self.cursor = second
+            return
+        # After a full turn every stored key has expired, so one lap is enough
+        for tick in range(self.cursor + 1, min(second, self.cursor + self.size) + 1):
+            slot = self.slots[tick % self.size]
+            if slot:
+                for key in slot:
+                    expires_at = self.expires.get(key)
+                    if expires_at is not None and expires_at <= now:
+                        del self.expires[key]
+                self.slots[tick % self.size] = None
+        self.cursor = max(self.cursor, second)
+        
+    def try_acquire(self, key, cooldown, now=None):
+        """Start a cooldown for key unless one is running; returns whether it started"""
+        if now is None:
+            now = time.monotonic()
+        self._advance(now)
+        expires_at = self.expires.get(key)
+        if expires_at is not None and expires_at > now:
+            return False
+        expires_at = now + min(max(cooldown, 0), self.max_cooldown)
+        self.expires[key] = expires_at
+        index = (int(expires_at) + 1) % self.size
+        if self.slots[index] is None:
+            self.slots[index] = set()
+        self.slots[index].add(key)
+        return True
+
+class LevelCurve:
+    """Quadratic XP curve where going from level L to L+1 costs base + growth * L"""
+    def __init__(self, base=100, growth=100):
+        self.base = base
+        self.growth = growth
+        # thresholds[L] is the total XP needed to reach level L
+        self.thresholds = [self.total_xp_for_level(level) for level in range(MAX_LEVEL + 1)]
+        
+    def total_xp_for_level(self, level):
+        return self.base * level + self.growth * level * (level - 1) // 2
+    
+    def level_for_xp(self, xp):
+        if xp < self.thresholds[-1]:
+            return bisect.bisect_right(self.thresholds, xp) - 1
+        # Past the table, solve growth/2 * L^2 + (base - growth/2) * L = xp for L exactly
+        if self.growth == 0:
+            return xp // self.base
+        linear = 2 * self.base - self.growth
+        level = (math.isqrt(linear * linear + 8 * self.growth * xp) - linear) // (2 * self.growth)
+        while self.total_xp_for_level(level + 1) <= xp:
+            level += 1
+        while self.total_xp_for_level(level) > xp:
+            level -= 1
+        return level
+
+def level_sql(xp):
+    """SQL for the level reached with xp on the curve bound as $2 thresholds, $3 base, $4 growth.
+    
+    Matches LevelCurve.level_for_xp: width_bucket bisects the threshold table, and
+    above it the quadratic is solved with a one-step correction for sqrt rounding.
+    """
+    total = "($3::numeric * {level} + $4::numeric * {level} * ({level} - 1) / 2)"
+    return f"""CASE
+        WHEN {xp} < ($2::bigint[])[array_length($2::bigint[], 1)] THEN width_bucket({xp}, $2::bigint[]) - 1
+        WHEN $4::bigint = 0 THEN {xp} / $3::bigint
+        ELSE (
+            SELECT guess - ({total.format(level='guess')} > {xp})::int
+                         + ({total.format(level='(guess + 1)')} <= {xp})::int
+            FROM (SELECT floor(
+                ($4::numeric - 2 * $3::numeric + sqrt(power(2 * $3::numeric - $4::numeric, 2) + 8 * $4::numeric * {xp}))
+                / (2 * $4::numeric)
+            )::bigint AS guess) solved
+        )
+    END"""
+
+@functools.lru_cache(maxsize=128)
+def compile_level_curve(base, growth):
+    """Build a curve's threshold table once and share it between guilds using the same settings"""
+    return LevelCurve(base, growth)
+
+DEFAULT_LEVEL_CURVE = compile_level_curve(100, 100)
+
+RANK_INDEX_LOAD = 512  # target bucket size for RankIndex
+
+class RankIndex:
+    """Order-statistic index over a guild's standings, ordered by level, then XP, then user ID.
+    
+    Keys live in sorted buckets with a Fenwick tree over the bucket sizes, so
+    updates, rank lookups and positional reads all run in O(log n).
+    """
+    def __init__(self, rows=()):
+        self.stats = {}  # user_id: (level, xp, messages)
+        keys = []
+        for user_id, level, xp, messages in rows:
+            self.stats[user_id] = (level, xp, messages)
+            keys.append((-level, -xp, -user_id))
+        keys.sort()
+        self._buckets = [keys[i:i + RANK_INDEX_LOAD] for i in range(0, len(keys), RANK_INDEX_LOAD)]
+        self._rebuild()
+        
+    def __len__(self):
+        return len(self.stats)
+    
+    def _rebuild(self):
+        self._maxes = [bucket[-1] for bucket in self._buckets]
+        size = len(self._buckets)
+        tree = [0] * (size + 1)
+        for i, bucket in enumerate(self._buckets, 1):
+            tree[i] += len(bucket)
+            parent = i + (i & -i)
+            if parent <= size:
+                tree[parent] += tree[i]
+        self._tree = tree
+        
+    def _add(self, bucket_index, delta):
+        i = bucket_index + 1
+        while i < len(self._tree):
+            self._tree[i] += delta
+            i += i & -i
+            
+    def _prefix(self, bucket_index):
+        """Number of keys stored in the buckets before bucket_index"""
+        total = 0
+        i = bucket_index
+        while i > 0:
+            total += self._tree[i]
+            i -= i & -i
+        return total
+    
+    def _locate(self, position):
+        """Find (bucket_index, offset) of the key at a 0-based position"""
+        bucket_index = 0
+        step = 1 << (len(self._buckets).bit_length() - 1) if self._buckets else 0
+        while step:
+            candidate = bucket_index + step
+            if candidate < len(self._tree) and self._tree[candidate] <= position:
+                bucket_index = candidate
+                position -= self._tree[candidate]
+            step >>= 1
+        return bucket_index, position
+    
+    def _insert(self, key):
+        if not self._buckets:
+            self._buckets.append([key])
+            self._rebuild()
+            return
+        i = min(bisect.bisect_left(self._maxes, key), len(self._buckets) - 1)
+        bucket = self._buckets[i]
+        bisect.insort(bucket, key)
+        self._maxes[i] = bucket[-1]
+        if len(bucket) > 2 * RANK_INDEX_LOAD:
+            self._buckets[i:i + 1] = [bucket[:RANK_INDEX_LOAD], bucket[RANK_INDEX_LOAD:]]
+            self._rebuild()
+        else:
+            self._add(i, 1)
+            
+    def _remove(self, key):
+        i = bisect.bisect_left(self._maxes, key)
+        bucket = self._buckets[i]
+        del bucket[bisect.bisect_left(bucket, key)]
+        if bucket:
+            self._maxes[i] = bucket[-1]
+            self._add(i, -1)
+        else:
+            del self._buckets[i]
+            self._rebuild()
+            
+    def _position(self, key):
+        """Number of keys that sort before key"""
+        i = bisect.bisect_left(self._maxes, key)
+        if i == len(self._buckets):
+            return len(self.stats)
+        return self._prefix(i) + bisect.bisect_left(self._buckets[i], key)
+    
+    def update(self, user_id, level, xp, messages):
+        old = self.stats.get(user_id)
+        if old is not None:
+            self._remove((-old[0], -old[1], -user_id))
+        self.stats[user_id] = (level, xp, messages)
+        self._insert((-level, -xp, -user_id))
+        
+    def rank(self, user_id):
+        """1-based rank of a user; members tied on level and XP share a rank"""
+        stats = self.stats.get(user_id)
+        if stats is None:
+            return None
+        return self._position((-stats[0], -stats[1], float('-inf'))) + 1
+    
+    def position(self, user_id):
+        """0-based position of a user in leaderboard order"""
+        stats = self.stats.get(user_id)
+        if stats is None:
+            return None
+        return self._position((-stats[0], -stats[1], -user_id))
+    
+    def slice(self, start, count):
+        """Get up to count (user_id, level, xp, messages) rows starting at a 0-based position"""
+        rows = []
+        if start >= len(self.stats) or count <= 0:
+            return rows
+        i, offset = self._locate(start)
+        while i < len(self._buckets) and len(rows) < count:
+            for key in self._buckets[i][offset:offset + count - len(rows)]:
+                user_id = -key[2]
+                rows.append((user_id, *self.stats[user_id]))
+            i += 1
+            offset = 0
+        return rows
+    
+    def top(self, count):
+        return self.slice(0, count)
+    
+    def around(self, user_id, radius=2):
+        """Get (start_position, rows) for the members just above and below a user"""
+        position = self.position(user_id)
+        if position is None:
+            return 0, []
+        start = max(0, position - radius)
+        return start, self.slice(start, radius * 2 + 1)
+
+async def fetch_level_curve(conn, guild_id):
+    """Load and compile a guild's XP curve"""
+    row = await conn.fetchrow(
+        "SELECT base, growth FROM leveling_curves WHERE guild_id = $1", guild_id
+    )
+    return compile_level_curve(row['base'], row['growth']) if row else DEFAULT_LEVEL_CURVE
+
+def rank_percentile(rank, total):
+    """Share of the other members ranked below a 1-based rank, as a percentage"""
+    return 100 * (total - rank) / (total - 1) if total > 1 else 100.0
+
+def read_json_array(file, chunk_size=65536):
+    """Yield the elements of a top-level JSON array without loading the whole file"""
+    decoder = json.JSONDecoder()
+    buffer = file.read(chunk_size).lstrip()
+    if not buffer.startswith('['):
+        raise ValueError("Expected a JSON array")
+    pos = 1
+    eof = False
+    while True:
+        # Skip whitespace and separators between elements
+        while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+            pos += 1
+        if pos < len(buffer) and buffer[pos] == ']':
+            return
+        try:
+            if pos >= len(buffer):
+                raise json.JSONDecodeError("Need more data", buffer, pos)
+            item, pos = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise ValueError("Truncated JSON array")
+            chunk = file.read(chunk_size)
+            eof = not chunk
+            buffer = buffer[pos:] + chunk
+            pos = 0
+            continue
+        yield item
+
+def iter_import_records(path):
+    """Stream (user_id, xp, messages) tuples from a CSV, JSON array or JSON Lines dump, optionally gzipped"""
+    name = path.lower()
+    opener = open
+    if name.endswith('.gz'):
+        opener = gzip.open
+        name = name[:-3]
+    # utf-8-sig drops the byte order mark spreadsheet exports start with
+    with opener(path, 'rt', newline='', encoding='utf-8-sig') as file:
+        if name.endswith('.csv'):
+            rows = csv.DictReader(file)
+        elif name.endswith(('.jsonl', '.ndjson')):
+            rows = (json.loads(line) for line in file if line.strip())
+        else:
+            rows = read_json_array(file)
+        for number, row in enumerate(rows, 1):
+            if not isinstance(row, dict):
+                raise ValueError(f"Row {number} is not an object: {str(row)[:50]}")
+            user_id = row.get('user_id') or row.get('id')
+            if user_id is None:
+                raise ValueError("Every row needs a user_id")
+            xp, messages = int(row.get('xp') or 0), int(row.get('messages') or 0)
+            if xp < 0 or messages < 0:
+                raise ValueError(f"XP and message counts can't be negative (user {user_id})")
+            yield int(user_id), xp, messages
+
+async def import_user_levels(conn, guild_id, records, curve):
+    """Bulk load (user_id, xp, messages) records into a guild with COPY; returns the number of rows read"""
+    total = 0
+    async with conn.transaction():
+        await conn.execute("""
+            CREATE TEMP TABLE user_levels_import (
+                user_id BIGINT,
+                xp BIGINT,
+                messages INT
+            ) ON COMMIT DROP
+        """)
+        batch = []
+        for record in records:
+            batch.append(record)
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                await conn.copy_records_to_table('user_levels_import', records=batch)
+                total += len(batch)
+                batch = []
+        if batch:
+            await conn.copy_records_to_table('user_levels_import', records=batch)
+            total += len(batch)
+            
+        # Duplicate users in a dump are merged, and levels come from the guild's curve.
+        # Every CTE reads the same snapshot, so the old rows give each user's change
+        # to their global total
+        await conn.execute("""
+            WITH merged AS (
+                SELECT user_id, SUM(xp)::bigint AS xp, SUM(messages)::int AS messages
+                FROM user_levels_import
+                GROUP BY user_id
+            ), previous AS (
+                SELECT user_id, xp, messages FROM user_levels
+                WHERE guild_id = $1 AND user_id IN (SELECT user_id FROM merged)
+            ), imported AS (
+                INSERT INTO user_levels (user_id, guild_id, xp, level, messages)
+                SELECT user_id, $1, xp, {level}, messages FROM merged
+                ON CONFLICT (user_id, guild_id)
+                DO UPDATE SET 
+                    xp = EXCLUDED.xp,
+                    level = EXCLUDED.level,
+                    messages = EXCLUDED.messages
+            )
+            INSERT INTO user_xp_totals (user_id, xp, messages)
+            SELECT m.user_id, m.xp - COALESCE(p.xp, 0), m.messages - COALESCE(p.messages, 0)
+            FROM merged m LEFT JOIN previous p USING (user_id)
+            ON CONFLICT (user_id) DO UPDATE SET
+                xp = user_xp_totals.xp + EXCLUDED.xp,
+                messages = user_xp_totals.messages + EXCLUDED.messages
+        """.format(level=level_sql('xp')), guild_id, curve.thresholds, curve.base, curve.growth)
+    return total
+
+async def export_user_levels(conn, guild_id, path):
+    """Stream a guild's user_levels rows into a gzipped CSV file with COPY"""
+    with gzip.open(path, 'wb') as file:
+        async def write(data):
+            file.write(data)
+        await conn.copy_from_query("""
+            SELECT user_id, xp, level, messages FROM user_levels
+            WHERE guild_id = $1
+            ORDER BY level DESC, xp DESC, user_id DESC
+        """, guild_id, output=write, format='csv', header=True)
+
+class LeaderboardView(discord.ui.View):
+    def __init__(self, cog, guild_id, rows, total, season=None):
+        super().__init__(timeout=120.0)
+        self.cog = cog
+        self.guild_id = guild_id
+        self.season = season  # None for the live leaderboard
+        self.rows = rows
+        self.page = 0
+        self.total = total
+        self.message = None
+        self.update_buttons()
+        
+    @property
+    def page_count(self):
+        return max(1, -(-self.total // LEADERBOARD_PAGE_SIZE))
+    
+    def update_buttons(self):
+        self.previous_page.disabled = self.page == 0
+        self.next_page.disabled = self.page >= self.page_count - 1
+        
+    async def show(self, interaction, rows, page):
+        index = None
+        description = None
+        if self.season is None:
+            index = await self.cog.get_rank_index(self.guild_id)
+            self.total = len(index)
+            if page == 0:
+                rows, description = await self.cog.get_leaderboard_top(self.guild_id, index)
+        if rows:
+            self.rows = rows
+            self.page = page
+        if description is None:
+            description = await self.cog.format_leaderboard_rows(self.rows, self.page * LEADERBOARD_PAGE_SIZE)
+        self.update_buttons()
+        embed = self.cog.build_leaderboard_embed(
+            description, self.page, self.total, interaction.user, index=index, season=self.season
+        )
+        await interaction.response.edit_message(embed=embed, view=self)
+        
+    @discord.ui.button(label="Previous", emoji="◀️", style=discord.ButtonStyle.secondary)
+    async def previous_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        if self.page == 1 and self.season is None:
+            # The live top page comes from the render cache
+            await self.show(interaction, None, 0)
+            return
+        user_id, level, xp, messages = self.rows[0]
+        rows = await self.cog.fetch_leaderboard_page(self.guild_id, before=(level, xp, user_id), season=self.season)
+        await self.show(interaction, rows, self.page - 1)
+        
+    @discord.ui.button(label="Next", emoji="▶️", style=discord.ButtonStyle.secondary)
+    async def next_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        user_id, level, xp, messages = self.rows[-1]
+        rows = await self.cog.fetch_leaderboard_page(self.guild_id, after=(level, xp, user_id), season=self.season)
+        await self.show(interaction, rows, self.page + 1)
+        
+    @discord.ui.button(label="My Page", emoji="📍", style=discord.ButtonStyle.primary)
+    async def my_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        position = await self.cog.get_leaderboard_position(self.guild_id, interaction.user.id, self.season)
+        if position is None:
+            embed = EmbedTemplates.info(
+                "No Stats Yet",
+                "You don't have any XP on this leaderboard!",
+                interaction.user
+            )
+            await interaction.response.send_message(embed=embed, ephemeral=True)
+            return
+            
+        page = position // LEADERBOARD_PAGE_SIZE
+        if page == 0 and self.season is None:
+            rows = None
+        elif page == 0:
+            rows = await self.cog.fetch_leaderboard_page(self.guild_id, season=self.season)
+        else:
+            # Seek from the last row of the previous page, so the jump costs one page read
+            user_id, level, xp, messages = await self.cog.get_leaderboard_row(
+                self.guild_id, page * LEADERBOARD_PAGE_SIZE - 1, self.season
+            )
+            rows = await self.cog.fetch_leaderboard_page(self.guild_id, after=(level, xp, user_id), season=self.season)
+        await self.show(interaction, rows, page)
+        
+    async def on_timeout(self):
+        for item in self.children:
+            item.disabled = True
+        if self.message:
+            try:
+                await self.message.edit(view=self)
+            except discord.HTTPException:
+                pass
+
 class Leveling(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.message_cooldowns = {}  # user_id: timestamp
+        self.message_cooldowns = CooldownWheel()  # (guild_id, user_id) cooldowns
+        self.settings_cache = {}  # guild_id: leveling settings
+        self.xp_cache = {}  # (guild_id, user_id): [xp, level, messages, last_seen]
+        self.pending_xp = {}  # (guild_id, user_id): [xp_gain, message_count]
+        self.level_curves = {}  # guild_id: LevelCurve
+        self.rank_indexes = {}  # guild_id: RankIndex, built on first use
+        self.leaderboard_cache = {}  # guild_id: (rendered_at, rows, description) for the top page
+        self.announcer = LevelUpAnnouncer()
+        self.flush_lock = asyncio.Lock()
+        self.flush_stop = asyncio.Event()  # set on unload so the flush loop exits between writes
+        self.flush_task = None
+        self.voice_sessions = {}  # guild_id: {user_id: monotonic time XP was last credited}
+        self.voice_task = None
+        self.card_pool = None  # ProcessPoolExecutor, started on the first rank card
+        self.avatar_cache = OrderedDict()  # avatar hash: image bytes
+        self.card_cache = OrderedDict()  # (guild_id, user_id): (card signature, PNG bytes)
+        self.level_rewards = {}  # guild_id: sorted [(level, role_id)]
+        self.xp_rules = {}  # guild_id: compiled XPRules
+        self.rank_cache = {}  # (guild_id, user_id): (expires_at, rank stats or None)
+        self.global_index = None  # RankIndex of XP summed across guilds, level fixed at 0
+        self.role_grants = RoleGrantQueue()
+        self.role_task = None
+        self.start_xp_flusher()
+        self.start_voice_ticker()
+        self.start_role_granter()
+        
+    async def cog_unload(self):
+        # Cancelling mid-write would drop the batch the flush already took, so let it finish
+        self.flush_stop.set()
+        if self.flush_task:
+            await self.flush_task
+        if self.voice_task:
+            self.voice_task.cancel()
+        if self.role_task:
+            self.role_task.cancel()
+        if self.card_pool:
+            self.card_pool.shutdown(wait=False, cancel_futures=True)
+        self.announcer.cancel()
+        # Write out whatever is still buffered so no XP is lost on shutdown
+        await self.flush_xp()
         
     def calculate_level(self, xp):
-        level = 0
-        while xp >= (level + 1) * 100:
-            xp -= (level + 1) * 100
-            level += 1
-        return level
+        return DEFAULT_LEVEL_CURVE.level_for_xp(xp)
     
     def calculate_total_xp_for_level(self, level):
-        total_xp = 0
-        for i in range(level):
-            total_xp += (i + 1) * 100
-        return total_xp
+        return DEFAULT_LEVEL_CURVE.total_xp_for_level(level)
+    
+    async def get_level_curve(self, guild_id):
+        """Get the compiled XP curve for a guild"""
+        curve = self.level_curves.get(guild_id)
+        if curve is not None:
+            return curve
+        if not self.bot.db:
+            return DEFAULT_LEVEL_CURVE
+        try:
+            curve = await fetch_level_curve(self.bot.db, guild_id)
+        except Exception as e:
+            print(f"Error getting level curve: {e}")
+            return DEFAULT_LEVEL_CURVE
+        self.level_curves[guild_id] = curve
+        return curve
+    
+    async def recompute_guild_levels(self, conn, guild_id, curve):
+        """Recompute every stored level in a guild with one set-based UPDATE"""
+        # level_sql bisects the threshold array inside Postgres, matching LevelCurve.level_for_xp
+        await conn.execute(f"""
+            UPDATE user_levels SET level = {level_sql('xp')}
+            WHERE guild_id = $1 AND level <> {level_sql('xp')}
+        """, guild_id, curve.thresholds, curve.base, curve.growth)
         
     async def get_leveling_settings(self, guild_id):
         """Get leveling settings for a guild"""
+        settings = self.settings_cache.get(guild_id)
+        if settings is not None:
+            return settings
+        defaults = {
+            'leveling_enabled': True,
+            'xp_cooldown': 60,
+            'levelup_mode': 'current',
+            'levelup_channel': None,
+            'xp_min': 15,
+            'xp_max': 25
+        }
         try:
-            result = await self.bot.db.fetchval(
-                "SELECT leveling_enabled FROM leveling_settings WHERE guild_id = $1", guild_id
+            result = await self.bot.db.fetchrow(
+                """SELECT leveling_enabled, xp_cooldown, levelup_mode, levelup_channel, xp_min, xp_max
+                   FROM leveling_settings WHERE guild_id = $1""", guild_id
             )
-            return result if result is not None else True  # Default enabled
         except Exception as e:
             print(f"Error getting leveling settings: {e}")
-            return True  # Default enabled
+            return defaults
+        settings = dict(defaults)
+        if result:
+            settings.update({key: value for key, value in result.items() if value is not None})
+        self.settings_cache[guild_id] = settings
+        return settings
+    
+    async def get_xp_rules(self, guild_id):
+        """Get a guild's compiled XP rules, compiling them on first use"""
+        rules = self.xp_rules.get(guild_id)
+        if rules is not None:
+            return rules
+        settings = await self.get_leveling_settings(guild_id)
+        rows = []
+        if self.bot.db:
+            try:
+                rows = await self.bot.db.fetch(
+                    "SELECT rule_type, target_id, multiplier FROM xp_rules WHERE guild_id = $1", guild_id
+                )
+            except Exception as e:
+                print(f"Error getting XP rules: {e}")
+                return XPRules(xp_min=settings['xp_min'], xp_max=settings['xp_max'])
+        rules = XPRules(
+            ((row['rule_type'], row['target_id'], row['multiplier']) for row in rows),
+            settings['xp_min'], settings['xp_max']
+        )
+        self.xp_rules[guild_id] = rules
+        return rules
+    
+    def get_metrics(self):
+        """Sizes of the in-memory leveling structures, for the /metrics endpoint"""
+        return {
+            'leveling_cooldowns': len(self.message_cooldowns),
+            'leveling_cached_users': len(self.xp_cache),
+            'leveling_pending_xp': len(self.pending_xp),
+            'leveling_rank_indexes': len(self.rank_indexes),
+            'leveling_global_users': len(self.global_index) if self.global_index is not None else 0,
+            'leveling_cached_ranks': len(self.rank_cache),
+            'leveling_cached_leaderboards': len(self.leaderboard_cache),
+            'leveling_queued_announcements': self.announcer.queued,
+            'leveling_dropped_announcements': self.announcer.dropped,
+            'leveling_voice_sessions': sum(len(sessions) for sessions in self.voice_sessions.values()),
+            'leveling_cached_avatars': len(self.avatar_cache),
+            'leveling_cached_rank_cards': len(self.card_cache),
+            'leveling_queued_role_grants': len(self.role_grants),
+            'leveling_role_edits': self.role_grants.edits
+        }
+    
+    def start_xp_flusher(self):
+        """Start the background task that writes buffered XP to the database"""
+        if self.flush_task is None or self.flush_task.done():
+            self.flush_task = asyncio.create_task(self.xp_flush_loop())
+    
+    async def xp_flush_loop(self):
+        """Flush buffered XP every few seconds until the cog unloads"""
+        while not self.bot.is_closed() and not self.flush_stop.is_set():
+            try:
+                await asyncio.wait_for(self.flush_stop.wait(), XP_FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            await self.flush_xp()
+            self.prune_xp_cache()
     
+    def start_voice_ticker(self):
+        """Start the background task that awards voice XP"""
+        if self.voice_task is None or self.voice_task.done():
+            self.voice_task = asyncio.create_task(self.voice_tick_loop())
+            
+    async def voice_tick_loop(self):
+        """Award voice XP to everyone in an eligible channel, across all guilds, once per tick"""
+        await self.bot.wait_until_ready()
+        # Pick up members who were already in voice when the bot started
+        now = time.monotonic()
+        for guild in self.bot.guilds:
+            for channel in guild.voice_channels:
+                for member in channel.members:
+                    if not member.bot:
+                        self.voice_sessions.setdefault(guild.id, {}).setdefault(member.id, now)
+                        
+        while not self.bot.is_closed():
+            await asyncio.sleep(VOICE_XP_TICK)
+            try:
+                await self.award_voice_xp()
+            except Exception as e:
+                print(f"Error awarding voice XP: {e}")
+                
+    def is_voice_eligible(self, member):
+        """Members earn voice XP when undeafened, outside the AFK channel and with another person present"""
+        voice = member.voice
+        if not voice or not voice.channel or voice.afk or voice.self_deaf or voice.deaf:
+            return False
+        if voice.channel == member.guild.afk_channel:
+            return False
+        return sum(1 for other in voice.channel.members if not other.bot) >= 2
+    
+    async def award_voice_xp(self):
+        """Credit every full tick spent in voice; the gains go out with the next batched flush"""
+        now = time.monotonic()
+        for guild_id, sessions in list(self.voice_sessions.items()):
+            guild = self.bot.get_guild(guild_id)
+            if guild is None:
+                del self.voice_sessions[guild_id]
+                continue
+            settings = await self.get_leveling_settings(guild_id)
+            rules = await self.get_xp_rules(guild_id)
+            for user_id, credited_at in list(sessions.items()):
+                ticks = int((now - credited_at) // VOICE_XP_TICK)
+                if ticks < 1:
+                    continue
+                sessions[user_id] = credited_at + ticks * VOICE_XP_TICK
+                member = guild.get_member(user_id)
+                if not settings['leveling_enabled'] or member is None or not self.is_voice_eligible(member):
+                    continue
+                # Voice channels follow the same no-XP and multiplier rules as messages
+                multiplier = rules.multiplier_for(member.voice.channel, member)
+                if multiplier is None:
+                    continue
+                xp_gain = max(1, round(ticks * VOICE_XP_PER_TICK * multiplier))
+                old_level, new_level, new_xp = await self.award_xp(guild_id, user_id, xp_gain, messages=0)
+                if new_level > old_level:
+                    await self.handle_level_up(member, member.voice.channel, new_level, new_xp)
+                    
+    def start_role_granter(self):
+        """Start the background task that hands out level reward roles"""
+        if self.role_task is None or self.role_task.done():
+            self.role_task = asyncio.create_task(self.role_granter_loop())
+            
+    async def role_granter_loop(self):
+        await self.bot.wait_until_ready()
+        # Catch up on rewards missed while the bot was offline
+        if self.bot.db:
+            try:
+                guild_ids = await self.bot.db.fetch("SELECT DISTINCT guild_id FROM level_rewards")
+                for row in guild_ids:
+                    guild = self.bot.get_guild(row['guild_id'])
+                    if guild:
+                        await self.reconcile_level_rewards(guild)
+            except Exception as e:
+                print(f"Error reconciling level rewards: {e}")
+        await self.role_grants.run(self.bot)
+        
+    async def get_level_rewards(self, guild_id):
+        """Get a guild's reward roles as a sorted list of (level, role_id)"""
+        rewards = self.level_rewards.get(guild_id)
+        if rewards is not None:
+            return rewards
+        if not self.bot.db:
+            return []
+        try:
+            rows = await self.bot.db.fetch(
+                "SELECT level, role_id FROM level_rewards WHERE guild_id = $1 ORDER BY level", guild_id
+            )
+        except Exception as e:
+            print(f"Error getting level rewards: {e}")
+            return []
+        rewards = [(row['level'], row['role_id']) for row in rows]
+        self.level_rewards[guild_id] = rewards
+        return rewards
+    
+    async def reconcile_level_rewards(self, guild):
+        """Queue every reward role members have earned but don't hold; returns members queued"""
+        rewards = await self.get_level_rewards(guild.id)
+        if not rewards:
+            return 0
+        await self.flush_xp()
+        rows = await self.bot.db.fetch(
+            "SELECT user_id, level FROM user_levels WHERE guild_id = $1 AND level >= $2",
+            guild.id, rewards[0][0]
+        )
+        levels = [level for level, role_id in rewards]
+        queued = 0
+        for row in rows:
+            member = guild.get_member(row['user_id'])
+            if member is None:
+                continue
+            earned = rewards[:bisect.bisect_right(levels, row['level'])]
+            missing = [role_id for level, role_id in earned if member.get_role(role_id) is None]
+            if missing:
+                self.role_grants.queue(guild.id, member.id, missing)
+                queued += 1
+        return queued
+    
+    async def handle_level_up(self, member, channel, level, xp):
+        """Announce a level-up and queue any reward roles it unlocks"""
+        await self.announce_level_up(member, channel, level, xp)
+        rewards = await self.get_level_rewards(member.guild.id)
+        missing = [role_id for reward_level, role_id in rewards if reward_level <= level and member.get_role(role_id) is None]
+        if missing:
+            self.role_grants.queue(member.guild.id, member.id, missing)
+            
+    def prune_xp_cache(self):
+        """Drop cached stats for users who have been idle and have nothing pending"""
+        cutoff = time.monotonic() - XP_CACHE_IDLE
+        idle = [
+            key for key, stats in self.xp_cache.items()
+            if stats[3] < cutoff and key not in self.pending_xp
+        ]
+        for key in idle:
+            del self.xp_cache[key]
+        now = time.monotonic()
+        expired = [key for key, (expires_at, stats) in self.rank_cache.items() if expires_at <= now]
+        for key in expired:
+            del self.rank_cache[key]
+    
+    async def get_cached_stats(self, guild_id, user_id):
+        """Get the live [xp, level, messages, last_seen] entry for a user, loading it once from the database"""
+        key = (guild_id, user_id)
+        stats = self.xp_cache.get(key)
+        if stats is None:
+            row = await self.bot.db.fetchrow("""
+                SELECT xp, level, messages FROM user_levels 
+                WHERE user_id = $1 AND guild_id = $2
+            """, user_id, guild_id)
+            # Another message may have loaded this user while we were waiting
+            stats = self.xp_cache.get(key)
+            if stats is None:
+                if row:
+                    stats = [row['xp'], row['level'], row['messages'], time.monotonic()]
+                else:
+                    stats = [0, 0, 0, time.monotonic()]
+                self.xp_cache[key] = stats
+        return stats
+    
+    async def award_xp(self, guild_id, user_id, xp_gain, messages=1):
+        """Add XP to the write-behind buffer and return (old_level, new_level, new_xp)"""
+        curve = await self.get_level_curve(guild_id)
+        stats = await self.get_cached_stats(guild_id, user_id)
+        old_level = stats[1]
+        stats[0] += xp_gain
+        stats[1] = curve.level_for_xp(stats[0])
+        stats[2] += messages
+        stats[3] = time.monotonic()
+        self.card_cache.pop((guild_id, user_id), None)
+        self.rank_cache.pop((guild_id, user_id), None)
+        
+        index = self.rank_indexes.get(guild_id)
+        if index is not None:
+            old_position = index.position(user_id)
+            index.update(user_id, stats[1], stats[0], stats[2])
+            # Only moves into, out of or within the top page change the cached render
+            if guild_id in self.leaderboard_cache and (
+                (old_position is not None and old_position < LEADERBOARD_PAGE_SIZE)
+                or index.position(user_id) < LEADERBOARD_PAGE_SIZE
+            ):
+                del self.leaderboard_cache[guild_id]
+                
+        if self.global_index is not None:
+            total_xp, total_messages = self.global_index.stats.get(user_id, (0, 0, 0))[1:]
+            self.global_index.update(user_id, 0, total_xp + xp_gain, total_messages + messages)
+        
+        pending = self.pending_xp.setdefault((guild_id, user_id), [0, 0])
+        pending[0] += xp_gain
+        pending[1] += messages
+        return old_level, stats[1], stats[0]
+    
+    async def get_rank_index(self, guild_id):
+        """Get a guild's rank index, loading it from the database the first time"""
+        index = self.rank_indexes.get(guild_id)
+        if index is not None:
+            return index
+        # The flush lock keeps a flush from landing between the read and the buffered gains below
+        async with self.flush_lock:
+            # Another command may have built the index while we were waiting
+            index = self.rank_indexes.get(guild_id)
+            if index is not None:
+                return index
+            rows = await self.bot.db.fetch(
+                "SELECT user_id, level, xp, messages FROM user_levels WHERE guild_id = $1", guild_id
+            )
+            index = RankIndex((row['user_id'], row['level'], row['xp'], row['messages']) for row in rows)
+            # Cached stats include buffered gains the database hasn't seen yet
+            for key, stats in self.xp_cache.items():
+                if key[0] == guild_id and key in self.pending_xp:
+                    index.update(key[1], stats[1], stats[0], stats[2])
+            self.rank_indexes[guild_id] = index
+            return index
+    
+    async def get_global_index(self):
+        """Get the cross-guild rank index, loading it from the maintained totals the first time"""
+        if self.global_index is not None:
+            return self.global_index
+        # The flush lock keeps a flush from landing between the read and the buffered gains below
+        async with self.flush_lock:
+            if self.global_index is not None:
+                return self.global_index
+            rows = await self.bot.db.fetch("SELECT user_id, xp, messages FROM user_xp_totals WHERE xp > 0")
+            index = RankIndex((row['user_id'], 0, row['xp'], row['messages']) for row in rows)
+            for (guild_id, user_id), (xp_gain, message_count) in self.pending_xp.items():
+                total_xp, total_messages = index.stats.get(user_id, (0, 0, 0))[1:]
+                index.update(user_id, 0, total_xp + xp_gain, total_messages + message_count)
+            self.global_index = index
+            return index
+    
+    async def announce_level_up(self, member, channel, level, xp):
+        """Queue a level-up announcement for wherever the guild routes them"""
+        settings = await self.get_leveling_settings(member.guild.id)
+        mode = settings['levelup_mode']
+        if mode == 'off':
+            return
+        if mode == 'dm':
+            destination = member
+        elif mode == 'channel':
+            destination = member.guild.get_channel(settings['levelup_channel']) or channel
+        else:
+            destination = channel
+        if destination is not None:
+            self.announcer.queue(destination, member, level, xp)
+            
+    async def reload_guild_cache(self, guild_id):
+        """Re-read a guild's cached stats after a bulk change to its rows; call while holding flush_lock"""
+        keys = [key for key in self.xp_cache if key[0] == guild_id]
+        for key in keys:
+            if key not in self.pending_xp:
+                del self.xp_cache[key]
+        pending_ids = [user_id for cached_guild_id, user_id in keys if (cached_guild_id, user_id) in self.pending_xp]
+        if pending_ids:
+            rows = await self.bot.db.fetch("""
+                SELECT user_id, xp, messages FROM user_levels
+                WHERE guild_id = $1 AND user_id = ANY($2::bigint[])
+            """, guild_id, pending_ids)
+            stored = {row['user_id']: row for row in rows}
+            curve = await self.get_level_curve(guild_id)
+            # Buffered gains still apply on top of the new stored values
+            for user_id in pending_ids:
+                key = (guild_id, user_id)
+                row = stored.get(user_id)
+                xp_gain, message_count = self.pending_xp[key]
+                xp = (row['xp'] if row else 0) + xp_gain
+                messages = (row['messages'] if row else 0) + message_count
+                self.xp_cache[key] = [xp, curve.level_for_xp(xp), messages, time.monotonic()]
+        self.invalidate_rank_index(guild_id)
+        self.global_index = None
+        
+    async def get_avatar_bytes(self, member):
+        """Fetch a member's avatar once per avatar hash"""
+        asset = member.display_avatar
+        data = self.avatar_cache.get(asset.key)
+        if data is not None:
+            self.avatar_cache.move_to_end(asset.key)
+            return data
+        try:
+            data = await asset.replace(size=256, format='png').read()
+        except discord.HTTPException:
+            return None
+        self.avatar_cache[asset.key] = data
+        if len(self.avatar_cache) > AVATAR_CACHE_SIZE:
+            self.avatar_cache.popitem(last=False)
+        return data
+    
+    async def get_rank_card(self, member, level, xp, rank):
+        """Render a member's rank card in the process pool, reusing it until their stats change"""
+        key = (member.guild.id, member.id)
+        signature = (level, xp, rank, member.display_name, member.display_avatar.key)
+        cached = self.card_cache.get(key)
+        if cached is not None and cached[0] == signature:
+            self.card_cache.move_to_end(key)
+            return cached[1]
+            
+        curve = await self.get_level_curve(member.guild.id)
+        level_start = curve.total_xp_for_level(level)
+        xp_for_level = curve.total_xp_for_level(level + 1) - level_start
+        avatar = await self.get_avatar_bytes(member)
+        
+        if self.card_pool is None:
+            self.card_pool = ProcessPoolExecutor(max_workers=RANK_CARD_WORKERS)
+        loop = asyncio.get_running_loop()
+        card = await loop.run_in_executor(
+            self.card_pool, render_rank_card,
+            avatar, member.display_name, level, rank, xp - level_start, xp_for_level, xp
+        )
+        self.card_cache[key] = (signature, card)
+        if len(self.card_cache) > RANK_CARD_CACHE_SIZE:
+            self.card_cache.popitem(last=False)
+        return card
+    
+    def invalidate_rank_index(self, guild_id):
+        """Forget a guild's rank index and rendered leaderboard after a bulk change"""
+        self.rank_indexes.pop(guild_id, None)
+        self.leaderboard_cache.pop(guild_id, None)
+        for key in [key for key in self.rank_cache if key[0] == guild_id]:
+            del self.rank_cache[key]
+        
+    async def get_leaderboard_top(self, guild_id, index):
+        """Get (rows, description) for the top leaderboard page, rendering it only when it changed"""
+        cached = self.leaderboard_cache.get(guild_id)
+        if cached is not None and time.monotonic() - cached[0] < LEADERBOARD_CACHE_TTL:
+            return cached[1], cached[2]
+        rows = index.top(LEADERBOARD_PAGE_SIZE)
+        description = await self.format_leaderboard_rows(rows)
+        self.leaderboard_cache[guild_id] = (time.monotonic(), rows, description)
+        return rows, description
+    
+    async def get_rank_stats(self, guild_id, user_id):
+        """Get a user's xp, level, messages, rank, guild size and percentile, or None without XP"""
+        index = self.rank_indexes.get(guild_id)
+        if index is not None:
+            stats = index.stats.get(user_id)
+            if stats is None:
+                return None
+            level, xp, messages = stats
+            rank = index.rank(user_id)
+            total = len(index)
+            return {
+                'xp': xp,
+                'level': level,
+                'messages': messages,
+                'rank': rank,
+                'total': total,
+                'percentile': rank_percentile(rank, total)
+            }
+            
+        key = (guild_id, user_id)
+        cached = self.rank_cache.get(key)
+        if cached is not None and cached[0] > time.monotonic():
+            return cached[1]
+            
+        # Buffered XP stays buffered: the user's own cached stats stand in for their row,
+        # and everyone else is ranked as stored
+        pending = self.xp_cache.get(key) if key in self.pending_xp else None
+        xp, level, messages = pending[:3] if pending else (None, None, None)
+        row = await self.bot.db.fetchrow("""
+            WITH members AS (
+                SELECT user_id, xp, level, messages FROM user_levels
+                WHERE guild_id = $1 AND NOT (user_id = $2 AND $3::bigint IS NOT NULL)
+                UNION ALL
+                SELECT $2::bigint, $3::bigint, $4::int, $5::int WHERE $3::bigint IS NOT NULL
+            )
+            SELECT xp, level, messages, rank, total FROM (
+                SELECT user_id, xp, level, messages,
+                    RANK() OVER (ORDER BY level DESC, xp DESC) AS rank,
+                    COUNT(*) OVER () AS total
+                FROM members
+            ) ranked
+            WHERE user_id = $2
+        """, guild_id, user_id, xp, level, messages)
+        stats = None
+        if row:
+            stats = dict(row)
+            stats['percentile'] = rank_percentile(stats['rank'], stats['total'])
+        self.rank_cache[key] = (time.monotonic() + RANK_CACHE_TTL, stats)
+        return stats
+    
+    async def fetch_leaderboard_page(self, guild_id, after=None, before=None, season=None):
+        """Fetch one leaderboard page by keyset; after/before are (level, xp, user_id) cursors"""
+        if season is None:
+            # Make sure buffered XP is in the table so pages agree with the rank index
+            await self.flush_xp()
+            source, args = "user_levels WHERE guild_id = $1", [guild_id]
+        else:
+            source, args = "user_levels_history WHERE guild_id = $1 AND season = $2", [guild_id, season]
+        n = len(args)
+        
+        if before is not None:
+            rows = await self.bot.db.fetch(f"""
+                SELECT user_id, level, xp, messages FROM {source}
+                AND (level, xp, user_id) > (${n + 1}, ${n + 2}, ${n + 3})
+                ORDER BY level, xp, user_id
+                LIMIT ${n + 4}
+            """, *args, *before, LEADERBOARD_PAGE_SIZE)
+            rows = list(reversed(rows))
+        elif after is not None:
+            rows = await self.bot.db.fetch(f"""
+                SELECT user_id, level, xp, messages FROM {source}
+                AND (level, xp, user_id) < (${n + 1}, ${n + 2}, ${n + 3})
+                ORDER BY level DESC, xp DESC, user_id DESC
+                LIMIT ${n + 4}
+            """, *args, *after, LEADERBOARD_PAGE_SIZE)
+        else:
+            rows = await self.bot.db.fetch(f"""
+                SELECT user_id, level, xp, messages FROM {source}
+                ORDER BY level DESC, xp DESC, user_id DESC
+                LIMIT ${n + 1}
+            """, *args, LEADERBOARD_PAGE_SIZE)
+        return [(row['user_id'], row['level'], row['xp'], row['messages']) for row in rows]
+    
+    async def get_leaderboard_position(self, guild_id, user_id, season=None):
+        """0-based leaderboard position of a user, or None if they have no XP there"""
+        if season is None:
+            index = await self.get_rank_index(guild_id)
+            return index.position(user_id)
+        return await self.bot.db.fetchval("""
+            SELECT (
+                SELECT COUNT(*) FROM user_levels_history h
+                WHERE h.guild_id = $1 AND h.season = $2
+                AND (h.level, h.xp, h.user_id) > (me.level, me.xp, me.user_id)
+            ) FROM user_levels_history me
+            WHERE me.guild_id = $1 AND me.season = $2 AND me.user_id = $3
+        """, guild_id, season, user_id)
+    
+    async def get_leaderboard_row(self, guild_id, position, season=None):
+        """Get the (user_id, level, xp, messages) row at a 0-based leaderboard position"""
+        if season is None:
+            index = await self.get_rank_index(guild_id)
+            return index.slice(position, 1)[0]
+        row = await self.bot.db.fetchrow("""
+            SELECT user_id, level, xp, messages FROM user_levels_history
+            WHERE guild_id = $1 AND season = $2
+            ORDER BY level DESC, xp DESC, user_id DESC
+            OFFSET $3 LIMIT 1
+        """, guild_id, season, position)
+        return row['user_id'], row['level'], row['xp'], row['messages']
+    
+    def build_leaderboard_embed(self, description, page, total, user, index=None, season=None):
+        """Build the embed for one leaderboard page; only the requester's rank is computed here"""
+        embed = discord.Embed(
+            title="🏆 Server Leaderboard" if season is None else f"🏆 Season {season} Leaderboard",
+            description=description,
+            color=0xffd700,
+            timestamp=datetime.now()
+        )
+        footer = f"Page {page + 1}/{max(1, -(-total // LEADERBOARD_PAGE_SIZE))}"
+        if index is not None:
+            # Members without XP rank behind everyone on the board
+            user_rank = index.rank(user.id) or len(index) + 1
+            footer += f" • {user.display_name}, you are ranked #{user_rank}"
+        embed.set_footer(text=footer)
+        return embed
+    
+    async def format_leaderboard_rows(self, rows, start_position=0, show_level=True):
+        """Render leaderboard rows as embed text"""
+        names = await resolve_names(self.bot, [row[0] for row in rows])
+        leaderboard_text = ""
+        for i, (user_id, level, xp, messages) in enumerate(rows, start_position + 1):
+            name = names.get(user_id) or f"Unknown User ({user_id})"
+                
+            if i == 1:
+                emoji = "🥇"
+            elif i == 2:
+                emoji = "🥈"
+            elif i == 3:
+                emoji = "🥉"
+            else:
+                emoji = f"**{i}.**"
+                
+            leaderboard_text += f"{emoji} **{name}**\n"
+            if show_level:
+                leaderboard_text += f"     Level {level} • {xp:,} XP • {messages:,} messages\n\n"
+            else:
+                leaderboard_text += f"     {xp:,} XP • {messages:,} messages\n\n"
+        return leaderboard_text
+    
+    async def flush_xp(self):
+        """Write all buffered XP gains in a single set-based upsert"""
+        if not self.bot.db:
+            return
+        async with self.flush_lock:
+            if not self.pending_xp:
+                return
+            batch, self.pending_xp = self.pending_xp, {}
+            
+            user_ids, guild_ids, xp_gains, levels, message_counts = [], [], [], [], []
+            for (guild_id, user_id), (xp_gain, message_count) in batch.items():
+                stats = self.xp_cache.get((guild_id, user_id))
+                user_ids.append(user_id)
+                guild_ids.append(guild_id)
+                xp_gains.append(xp_gain)
+                levels.append(stats[1] if stats else 0)
+                message_counts.append(message_count)
+                
+            try:
+                # Per-guild rows and the cross-guild totals move together in one statement
+                await self.bot.db.execute("""
+                    WITH batch AS (
+                        SELECT * FROM unnest($1::bigint[], $2::bigint[], $3::bigint[], $4::int[], $5::int[])
+                            AS batch(user_id, guild_id, xp, level, messages)
+                    ), upserted AS (
+                        INSERT INTO user_levels (user_id, guild_id, xp, level, messages)
+                        SELECT * FROM batch
+                        ON CONFLICT (user_id, guild_id)
+                        DO UPDATE SET 
+                            xp = user_levels.xp + EXCLUDED.xp,
+                            level = EXCLUDED.level,
+                            messages = user_levels.messages + EXCLUDED.messages
+                    )
+                    INSERT INTO user_xp_totals (user_id, xp, messages)
+                    SELECT user_id, SUM(xp), SUM(messages) FROM batch GROUP BY user_id
+                    ON CONFLICT (user_id) DO UPDATE SET
+                        xp = user_xp_totals.xp + EXCLUDED.xp,
+                        messages = user_xp_totals.messages + EXCLUDED.messages
+                """, user_ids, guild_ids, xp_gains, levels, message_counts)
+            except Exception as e:
+                print(f"Error flushing XP: {e}")
+                # Put the batch back so the next flush retries it
+                for key, (xp_gain, message_count) in batch.items():
+                    pending = self.pending_xp.setdefault(key, [0, 0])
+                    pending[0] += xp_gain
+                    pending[1] += message_count
+    
+    @commands.Cog.listener()
+    async def on_voice_state_update(self, member, before, after):
+        if member.bot:
+            return
+        if after.channel is None:
+            sessions = self.voice_sessions.get(member.guild.id)
+            if sessions:
+                sessions.pop(member.id, None)
+        elif before.channel is None:
+            self.voice_sessions.setdefault(member.guild.id, {})[member.id] = time.monotonic()
+            
     @commands.Cog.listener()
     async def on_message(self, message):
         if message.author.bot or not message.guild:
             return
             
         # Check if leveling is enabled for this guild
-        leveling_enabled = await self.get_leveling_settings(message.guild.id)
-        if not leveling_enabled:
+        settings = await self.get_leveling_settings(message.guild.id)
+        if not settings['leveling_enabled']:
             return
             
         user_id = message.author.id
         guild_id = message.guild.id
         
+        # No-XP channels are skipped before the cooldown starts
+        rules = await self.get_xp_rules(guild_id)
+        xp_gain = rules.xp_for(message)
+        if not xp_gain:
+            return
+            
         # Check cooldown (prevent spam)
-        now = datetime.now().timestamp()
-        if user_id in self.message_cooldowns:
-            if now - self.message_cooldowns[user_id] < 60:  # 60 second cooldown
-                return
-                
-        self.message_cooldowns[user_id] = now
-        
-        # Random XP gain (15-25 XP per message)
-        xp_gain = random.randint(15, 25)
+        if not self.message_cooldowns.try_acquire((guild_id, user_id), settings['xp_cooldown']):
+            return
         
         try:
-            # Get current stats
-            current_data = await self.bot.db.fetchrow("""
-                SELECT xp, level, messages FROM user_levels 
-                WHERE user_id = $1 AND guild_id = $2
-            """, user_id, guild_id)
-            
-            if current_data:
-                new_xp = current_data['xp'] + xp_gain
-                new_messages = current_data['messages'] + 1
-                old_level = current_data['level']
-            else:
-                new_xp = xp_gain
-                new_messages = 1
-                old_level = 0
-                
-            new_level = self.calculate_level(new_xp)
-            
-            # Update database
-            await self.bot.db.execute("""
-                INSERT INTO user_levels (user_id, guild_id, xp, level, messages)
-                VALUES ($1, $2, $3, $4, $5)
-                ON CONFLICT (user_id, guild_id)
-                DO UPDATE SET 
-                    xp = $3,
-                    level = $4,
-                    messages = $5
-            """, user_id, guild_id, new_xp, new_level, new_messages)
+            # Buffer the gain; the database write happens on the next flush
+            old_level, new_level, new_xp = await self.award_xp(guild_id, user_id, xp_gain)
             
             # Check for level up
             if new_level > old_level:
-                embed = EmbedTemplates.level_up(message.author, new_level, new_xp)
-                await message.channel.send(embed=embed)
+                await self.handle_level_up(message.author, message.channel, new_level, new_xp)
                 
         except Exception as e:
             print(f"Error in leveling system: {e}")
@@ -100,11 +1409,7 @@ class Leveling(commands.Cog):
             member = ctx.author
             
         try:
-            # Get user stats
-            user_data = await self.bot.db.fetchrow("""
-                SELECT xp, level, messages FROM user_levels 
-                WHERE user_id = $1 AND guild_id = $2
-            """, member.id, ctx.guild.id)
+            user_data = await self.get_rank_stats(ctx.guild.id, member.id)
             
             if not user_data:
                 if member == ctx.author:
@@ -122,21 +1427,17 @@ class Leveling(commands.Cog):
                 await ctx.send(embed=embed)
                 return
                 
-            # Get user rank
-            rank = await self.bot.db.fetchval("""
-                SELECT COUNT(*) + 1 FROM user_levels 
-                WHERE guild_id = $1 AND (
-                    level > $2 OR 
-                    (level = $2 AND xp > $3)
-                )
-            """, ctx.guild.id, user_data['level'], user_data['xp'])
-            
             embed = EmbedTemplates.user_stats(
                 member, 
                 user_data['level'], 
                 user_data['xp'], 
                 user_data['messages'],
-                rank
+                user_data['rank']
+            )
+            embed.add_field(
+                name="Percentile",
+                value=f"Ahead of {user_data['percentile']:.1f}% of {user_data['total']:,} members",
+                inline=False
             )
             
             await ctx.send(embed=embed)
@@ -149,19 +1450,97 @@ class Leveling(commands.Cog):
             )
             await ctx.send(embed=embed)
             
+    @commands.command(name='rankcard', aliases=['card'])
+    async def rank_card(self, ctx, member: discord.Member = None):
+        if Image is None:
+            # Pillow isn't installed, so show the text version instead
+            await ctx.invoke(self.rank, member=member)
+            return
+        if member is None:
+            member = ctx.author
+            
+        try:
+            user_data = await self.get_rank_stats(ctx.guild.id, member.id)
+            if not user_data:
+                embed = EmbedTemplates.info(
+                    "No Stats Found",
+                    f"{member.mention} hasn't gained any XP yet.",
+                    ctx.author
+                )
+                await ctx.send(embed=embed)
+                return
+                
+            card = await self.get_rank_card(member, user_data['level'], user_data['xp'], user_data['rank'])
+            await ctx.send(file=discord.File(io.BytesIO(card), filename="rank.png"))
+            
+        except Exception as e:
+            embed = EmbedTemplates.error(
+                "Error",
+                f"Failed to create rank card. Error: {str(e)}",
+                ctx.author
+            )
+            await ctx.send(embed=embed)
+            
     @commands.command(name='leaderboard', aliases=['lb', 'top'])
-    async def leaderboard(self, ctx):
+    async def leaderboard(self, ctx, scope: str = None):
+        if scope and scope.lower().startswith('season:'):
+            await self.season_leaderboard(ctx, scope.split(':', 1)[1])
+            return
+        if scope and scope.lower() == 'global':
+            await self.global_leaderboard(ctx)
+            return
+            
         try:
-            # Get top 10 users
-            top_users = await self.bot.db.fetch("""
-                SELECT user_id, xp, level, messages 
-                FROM user_levels 
-                WHERE guild_id = $1 
-                ORDER BY level DESC, xp DESC 
-                LIMIT 10
-            """, ctx.guild.id)
-            
-            if not top_users:
+            index = await self.get_rank_index(ctx.guild.id)
+            
+            if not len(index):
+                embed = EmbedTemplates.info(
+                    "Empty Leaderboard",
+                    "No one has gained XP yet! Start chatting to be first on the leaderboard!",
+                    ctx.author
+                )
+                await ctx.send(embed=embed)
+                return
+                
+            if scope and scope.lower() in ('me', 'around'):
+                start, rows = index.around(ctx.author.id)
+                if not rows:
+                    embed = EmbedTemplates.info(
+                        "No Stats Yet",
+                        "Start chatting to gain XP and appear on the leaderboard!",
+                        ctx.author
+                    )
+                    await ctx.send(embed=embed)
+                    return
+                embed = discord.Embed(
+                    title="🏆 Members Around You",
+                    description=await self.format_leaderboard_rows(rows, start),
+                    color=0xffd700,
+                    timestamp=datetime.now()
+                )
+                user_rank = index.rank(ctx.author.id)
+                embed.set_footer(text=f"{ctx.author.display_name}, you are ranked #{user_rank}")
+                await ctx.send(embed=embed)
+                return
+                
+            rows, description = await self.get_leaderboard_top(ctx.guild.id, index)
+            embed = self.build_leaderboard_embed(description, 0, len(index), ctx.author, index=index)
+            view = LeaderboardView(self, ctx.guild.id, rows, len(index))
+            view.message = await ctx.send(embed=embed, view=view)
+            
+        except Exception as e:
+            embed = EmbedTemplates.error(
+                "Leaderboard Error",
+                f"Failed to load leaderboard. Error: {str(e)}",
+                ctx.author
+            )
+            await ctx.send(embed=embed)
+            
+    async def global_leaderboard(self, ctx):
+        """Show the top members by XP summed across every server"""
+        try:
+            index = await self.get_global_index()
+            if not len(index):
                 embed = EmbedTemplates.info(
                     "Empty Leaderboard",
                     "No one has gained XP yet! Start chatting to be first on the leaderboard!",
@@ -171,47 +1550,58 @@ class Leveling(commands.Cog):
                 return
                 
             embed = discord.Embed(
-                title="🏆 Server Leaderboard",
-                description="Top 10 most active members",
+                title="🌍 Global Leaderboard",
+                description=await self.format_leaderboard_rows(index.top(LEADERBOARD_PAGE_SIZE), show_level=False),
                 color=0xffd700,
                 timestamp=datetime.now()
             )
+            user_rank = index.rank(ctx.author.id)
+            if user_rank:
+                embed.set_footer(text=f"{ctx.author.display_name}, you are ranked #{user_rank:,} of {len(index):,}")
+            else:
+                embed.set_footer(text=f"{len(index):,} members ranked across all servers")
+            await ctx.send(embed=embed)
             
-            leaderboard_text = ""
-            for i, user_data in enumerate(top_users, 1):
-                user = self.bot.get_user(user_data['user_id'])
-                if user:
-                    name = user.display_name
-                else:
-                    name = f"Unknown User ({user_data['user_id']})"
-                    
-                if i == 1:
-                    emoji = "🥇"
-                elif i == 2:
-                    emoji = "🥈"
-                elif i == 3:
-                    emoji = "🥉"
-                else:
-                    emoji = f"**{i}.**"
-                    
-                leaderboard_text += f"{emoji} **{name}**\n"
-                leaderboard_text += f"     Level {user_data['level']} • {user_data['xp']:,} XP • {user_data['messages']:,} messages\n\n"
-                
-            embed.description = leaderboard_text
-            
-            # Find current user's rank
-            user_rank = await self.bot.db.fetchval("""
-                SELECT COUNT(*) + 1 FROM user_levels 
-                WHERE guild_id = $1 AND user_id != $2 AND (
-                    level > (SELECT COALESCE(level, 0) FROM user_levels WHERE user_id = $2 AND guild_id = $1) OR 
-                    (level = (SELECT COALESCE(level, 0) FROM user_levels WHERE user_id = $2 AND guild_id = $1) 
-                     AND xp > (SELECT COALESCE(xp, 0) FROM user_levels WHERE user_id = $2 AND guild_id = $1))
-                )
-            """, ctx.guild.id, ctx.author.id)
-            
-            embed.set_footer(text=f"{ctx.author.display_name}, you are ranked #{user_rank}")
+        except Exception as e:
+            embed = EmbedTemplates.error(
+                "Leaderboard Error",
+                f"Failed to load leaderboard. Error: {str(e)}",
+                ctx.author
+            )
+            await ctx.send(embed=embed)
             
+    async def season_leaderboard(self, ctx, season):
+        """Show the archived leaderboard of a past season"""
+        try:
+            season = int(season)
+        except ValueError:
+            embed = EmbedTemplates.error(
+                "Invalid Season",
+                "Use a season number, e.g. `leaderboard season:1`",
+                ctx.author
+            )
             await ctx.send(embed=embed)
+            return
+            
+        try:
+            total = await self.bot.db.fetchval(
+                "SELECT members FROM leveling_seasons WHERE guild_id = $1 AND season = $2", ctx.guild.id, season
+            )
+            if not total:
+                embed = EmbedTemplates.info(
+                    "Season Not Found",
+                    f"There is no archived leaderboard for season {season}.",
+                    ctx.author
+                )
+                await ctx.send(embed=embed)
+                return
+                
+            rows = await self.fetch_leaderboard_page(ctx.guild.id, season=season)
+            embed = self.build_leaderboard_embed(
+                await self.format_leaderboard_rows(rows), 0, total, ctx.author, season=season
+            )
+            view = LeaderboardView(self, ctx.guild.id, rows, total, season=season)
+            view.message = await ctx.send(embed=embed, view=view)
             
         except Exception as e:
             embed = EmbedTemplates.error(
@@ -237,12 +1627,13 @@ class Leveling(commands.Cog):
         """Toggle leveling system for this server"""
         try:
             current = await self.get_leveling_settings(ctx.guild.id)
-            new_state = not current
+            new_state = not current['leveling_enabled']
             
             await self.bot.db.execute("""
                 INSERT INTO leveling_settings (guild_id, leveling_enabled) VALUES ($1, $2)
                 ON CONFLICT (guild_id) DO UPDATE SET leveling_enabled = $2
             """, ctx.guild.id, new_state)
+            self.settings_cache.pop(ctx.guild.id, None)
             
             status = "enabled" if new_state else "disabled"
             embed = EmbedTemplates.success(
@@ -259,6 +1650,607 @@ class Leveling(commands.Cog):
                 ctx.author
             )
             await ctx.send(embed=embed)
+            
+    @commands.command(name='levelup')
+    @commands.has_permissions(manage_guild=True)
+    async def level_up_channel(self, ctx, target: str = None):
+        """Choose where level-up announcements are sent"""
+        if target is None:
+            settings = await self.get_leveling_settings(ctx.guild.id)
+            mode = settings['levelup_mode']
+            if mode == 'channel':
+                channel = ctx.guild.get_channel(settings['levelup_channel'])
+                where = channel.mention if channel else "a deleted channel"
+            elif mode == 'dm':
+                where = "members' DMs"
+            elif mode == 'off':
+                where = "nowhere (disabled)"
+            else:
+                where = "the channel the member leveled up in"
+            embed = EmbedTemplates.info(
+                "Level-Up Announcements",
+                f"Level-ups are announced in **{where}**.\n"
+                f"Use `here`, `dm`, `off` or a #channel to change this.",
+                ctx.author
+            )
+            await ctx.send(embed=embed)
+            return
+            
+        channel_id = None
+        if ctx.message.channel_mentions:
+            mode = 'channel'
+            channel_id = ctx.message.channel_mentions[0].id
+        else:
+            mode = {'here': 'current', 'current': 'current', 'dm': 'dm', 'off': 'off'}.get(target.lower())
+        if mode is None:
+            embed = EmbedTemplates.error(
+                "Invalid Target",
+                "Use `here`, `dm`, `off` or mention a channel!",
+                ctx.author
+            )
+            await ctx.send(embed=embed)
+            return
+            
+        try:
+            await self.bot.db.execute("""
+                INSERT INTO leveling_settings (guild_id, levelup_mode, levelup_channel) VALUES ($1, $2, $3)
+                ON CONFLICT (guild_id) DO UPDATE SET levelup_mode = $2, levelup_channel = $3
+            """, ctx.guild.id, mode, channel_id)
+            self.settings_cache.pop(ctx.guild.id, None)
+            
+            embed = EmbedTemplates.success(
+                "Level-Up Announcements Updated",
+                f"Level-up announcements will now go to **{target if mode != 'current' else 'the current channel'}**!",
+                ctx.author
+            )
+            await ctx.send(embed=embed)
+            
+        except Exception as e:
+            embed = EmbedTemplates.error(
+                "Database Error",
+                "Failed to update level-up announcements.",
+                ctx.author
+            )
+            await ctx.send(embed=embed)
+            
+    @commands.command(name='xpcooldown')
+    @commands.has_permissions(manage_guild=True)
+    async def xp_cooldown(self, ctx, seconds: int = None):
+        """Set how long members wait between XP-earning messages"""
+        if seconds is None:
+            settings = await self.get_leveling_settings(ctx.guild.id)
+            embed = EmbedTemplates.info(
+                "XP Cooldown",
+                f"Members can earn XP once every **{settings['xp_cooldown']}** seconds.",
+                ctx.author
+            )
+            await ctx.send(embed=embed)
+            return
+            
+        if seconds < 0 or seconds > MAX_XP_COOLDOWN:
+            embed = EmbedTemplates.error(
+                "Invalid Cooldown",
+                f"Cooldown must be between 0 and {MAX_XP_COOLDOWN} seconds!",
+                ctx.author
+            )
+            await ctx.send(embed=embed)
+            return
+            
+        try:
+            await self.bot.db.execute("""
+                INSERT INTO leveling_settings (guild_id, xp_cooldown) VALUES ($1, $2)
+                ON CONFLICT (guild_id) DO UPDATE SET xp_cooldown = $2
+            """, ctx.guild.id, seconds)
+            self.settings_cache.pop(ctx.guild.id, None)
+            
+            embed = EmbedTemplates.success(
+                "XP Cooldown Updated",
+                f"Members can now earn XP once every **{seconds}** seconds!",
+                ctx.author
+            )
+            await ctx.send(embed=embed)
+            
+        except Exception as e:
+            embed = EmbedTemplates.error(
+                "Database Error",
+                "Failed to update the XP cooldown.",
+                ctx.author
+            )
+            await ctx.send(embed=embed)
+            
+    @commands.command(name='levelcurve')
+    @commands.has_permissions(manage_guild=True)
+    async def level_curve(self, ctx, base: int = None, growth: int = None):
+        """View or change how much XP each level costs"""
+        if base is None:
+            curve = await self.get_level_curve(ctx.guild.id)
+            embed = EmbedTemplates.info(
+                "Level Curve",
+                f"Level **L → L+1** costs **{curve.base} + {curve.growth} × L** XP.\n"
+                f"Level 10 needs **{curve.total_xp_for_level(10):,}** XP in total, "
+                f"level 50 needs **{curve.total_xp_for_level(50):,}** XP.",
+                ctx.author
+            )
+            await ctx.send(embed=embed)
+            return
+            
+        if growth is None:
+            # Changing only the base keeps the current growth
+            growth = (await self.get_level_curve(ctx.guild.id)).growth
+        if base < 10 or base > 10000 or growth < 0 or growth > 10000:
+            embed = EmbedTemplates.error(
+                "Invalid Curve",
+                "Base must be between 10 and 10000 and growth between 0 and 10000!",
+                ctx.author
+            )
+            await ctx.send(embed=embed)
+            return
+            
+        curve = compile_level_curve(base, growth)
+        try:
+            # Write out buffered XP first, then hold the flush lock so no batch
+            # lands with levels from the old curve while we recompute
+            await self.flush_xp()
+            async with self.flush_lock:
+                async with self.bot.db.acquire() as conn:
+                    async with conn.transaction():
+                        await conn.execute("""
+                            INSERT INTO leveling_curves (guild_id, base, growth) VALUES ($1, $2, $3)
+                            ON CONFLICT (guild_id) DO UPDATE SET base = $2, growth = $3
+                        """, ctx.guild.id, base, growth)
+                        await self.recompute_guild_levels(conn, ctx.guild.id, curve)
+                        
+                self.level_curves[ctx.guild.id] = curve
+                self.invalidate_rank_index(ctx.guild.id)
+                for (guild_id, user_id), stats in self.xp_cache.items():
+                    if guild_id == ctx.guild.id:
+                        stats[1] = curve.level_for_xp(stats[0])
+                        
+            embed = EmbedTemplates.success(
+                "Level Curve Updated",
+                f"Level **L → L+1** now costs **{base} + {growth} × L** XP. "
+                f"All member levels have been recalculated!",
+                ctx.author
+            )
+            await ctx.send(embed=embed)
+            
+        except Exception as e:
+            embed = EmbedTemplates.error(
+                "Database Error",
+                "Failed to update the level curve.",
+                ctx.author
+            )
+            await ctx.send(embed=embed)
+
+    @commands.group(name='xprules', invoke_without_command=True)
+    @commands.has_permissions(manage_guild=True)
+    async def xp_rules_group(self, ctx):
+        """Show this server's XP rules"""
+        rules = await self.get_xp_rules(ctx.guild.id)
+        embed = discord.Embed(
+            title="⚙️ XP Rules",
+            color=0x9b59b6
+        )
+        embed.add_field(name="XP per Message", value=f"{rules.xp_min}-{rules.xp_max}", inline=False)
+        embed.add_field(
+            name="No-XP Channels",
+            value=", ".join(f"<#{channel_id}>" for channel_id in rules.no_xp_channels) or "None",
+            inline=False
+        )
+        embed.add_field(
+            name="Channel Multipliers",
+            value="\n".join(f"<#{channel_id}> → ×{value:g}" for channel_id, value in rules.channel_multipliers.items()) or "None",
+            inline=False
+        )
+        embed.add_field(
+            name="Role Multipliers",
+            value="\n".join(f"<@&{role_id}> → ×{value:g}" for role_id, value in rules.role_multipliers.items()) or "None",
+            inline=False
+        )
+        
+        prefix = await self.bot.get_prefix(ctx.message)
+        if isinstance(prefix, list):
+            prefix = prefix[0]
+        embed.add_field(
+            name="🔧 Commands",
+            value=f"`{prefix}xprules range <min> <max>` - Set XP per message\n"
+                  f"`{prefix}xprules nochannel <channel>` - Toggle XP in a channel or category\n"
+                  f"`{prefix}xprules channel <channel> <multiplier>` - Boost XP in a channel (1 to remove)\n"
+                  f"`{prefix}xprules role <role> <multiplier>` - Boost XP for a role (1 to remove)",
+            inline=False
+        )
+        embed.set_footer(text=f"Requested by {ctx.author.display_name}")
+        await ctx.send(embed=embed)
+        
+    async def set_xp_multiplier(self, ctx, rule_type, target_id, multiplier):
+        """Store or clear a multiplier rule and recompile the guild's rules"""
+        if multiplier < 0.1 or multiplier > 10:
+            embed = EmbedTemplates.error(
+                "Invalid Multiplier",
+                "Multiplier must be between 0.1 and 10!",
+                ctx.author
+            )
+            await ctx.send(embed=embed)
+            return False
+        try:
+            if multiplier == 1:
+                await self.bot.db.execute(
+                    "DELETE FROM xp_rules WHERE guild_id = $1 AND rule_type = $2 AND target_id = $3",
+                    ctx.guild.id, rule_type, target_id
+                )
+            else:
+                await self.bot.db.execute("""
+                    INSERT INTO xp_rules (guild_id, rule_type, target_id, multiplier) VALUES ($1, $2, $3, $4)
+                    ON CONFLICT (guild_id, rule_type, target_id) DO UPDATE SET multiplier = $4
+                """, ctx.guild.id, rule_type, target_id, multiplier)
+            self.xp_rules.pop(ctx.guild.id, None)
+            return True
+        except Exception as e:
+            embed = EmbedTemplates.error("Database Error", "Failed to update XP rules.", ctx.author)
+            await ctx.send(embed=embed)
+            return False
+        
+    @xp_rules_group.command(name='range')
+    @commands.has_permissions(manage_guild=True)
+    async def xp_range(self, ctx, minimum: int, maximum: int):
+        """Set how much XP each message earns"""
+        if minimum < 1 or maximum > 1000 or minimum > maximum:
+            embed = EmbedTemplates.error(
+                "Invalid Range",
+                "XP must be between 1 and 1000, and the minimum can't be above the maximum!",
+                ctx.author
+            )
+            await ctx.send(embed=embed)
+            return
+            
+        try:
+            await self.bot.db.execute("""
+                INSERT INTO leveling_settings (guild_id, xp_min, xp_max) VALUES ($1, $2, $3)
+                ON CONFLICT (guild_id) DO UPDATE SET xp_min = $2, xp_max = $3
+            """, ctx.guild.id, minimum, maximum)
+            self.settings_cache.pop(ctx.guild.id, None)
+            self.xp_rules.pop(ctx.guild.id, None)
+            
+            embed = EmbedTemplates.success(
+                "XP Range Updated",
+                f"Messages now earn **{minimum}-{maximum}** XP!",
+                ctx.author
+            )
+            await ctx.send(embed=embed)
+            
+        except Exception as e:
+            embed = EmbedTemplates.error("Database Error", "Failed to update XP rules.", ctx.author)
+            await ctx.send(embed=embed)
+            
+    @xp_rules_group.command(name='nochannel')
+    @commands.has_permissions(manage_guild=True)
+    async def xp_no_channel(self, ctx, channel: discord.abc.GuildChannel):
+        """Toggle whether a channel or category gives XP"""
+        try:
+            result = await self.bot.db.execute(
+                "DELETE FROM xp_rules WHERE guild_id = $1 AND rule_type = 'no_xp_channel' AND target_id = $2",
+                ctx.guild.id, channel.id
+            )
+            if result == "DELETE 0":
+                await self.bot.db.execute(
+                    "INSERT INTO xp_rules (guild_id, rule_type, target_id) VALUES ($1, 'no_xp_channel', $2)",
+                    ctx.guild.id, channel.id
+                )
+                description = f"Messages in {channel.mention} will no longer earn XP!"
+            else:
+                description = f"Messages in {channel.mention} earn XP again!"
+            self.xp_rules.pop(ctx.guild.id, None)
+            
+            embed = EmbedTemplates.success("XP Rules Updated", description, ctx.author)
+            await ctx.send(embed=embed)
+            
+        except Exception as e:
+            embed = EmbedTemplates.error("Database Error", "Failed to update XP rules.", ctx.author)
+            await ctx.send(embed=embed)
+            
+    @xp_rules_group.command(name='channel')
+    @commands.has_permissions(manage_guild=True)
+    async def xp_channel_multiplier(self, ctx, channel: discord.abc.GuildChannel, multiplier: float):
+        """Set an XP multiplier for a channel or category"""
+        if await self.set_xp_multiplier(ctx, 'channel_multiplier', channel.id, multiplier):
+            embed = EmbedTemplates.success(
+                "XP Rules Updated",
+                f"Messages in {channel.mention} now earn **×{multiplier:g}** XP!",
+                ctx.author
+            )
+            await ctx.send(embed=embed)
+            
+    @xp_rules_group.command(name='role')
+    @commands.has_permissions(manage_guild=True)
+    async def xp_role_multiplier(self, ctx, role: discord.Role, multiplier: float):
+        """Set an XP multiplier for members with a role"""
+        if await self.set_xp_multiplier(ctx, 'role_multiplier', role.id, multiplier):
+            embed = EmbedTemplates.success(
+                "XP Rules Updated",
+                f"Members with {role.mention} now earn **×{multiplier:g}** XP!",
+                ctx.author
+            )
+            await ctx.send(embed=embed)
+            
+    @commands.group(name='levelrewards', aliases=['rewards'], invoke_without_command=True)
+    @commands.has_permissions(manage_roles=True)
+    async def level_rewards_group(self, ctx):
+        """Show the roles members get for reaching levels"""
+        rewards = await self.get_level_rewards(ctx.guild.id)
+        embed = discord.Embed(
+            title="🎁 Level Rewards",
+            color=0x9b59b6
+        )
+        if rewards:
+            lines = []
+            for level, role_id in rewards:
+                role = ctx.guild.get_role(role_id)
+                lines.append(f"**Level {level}** → {role.mention if role else f'Deleted role ({role_id})'}")
+            embed.add_field(name="Current Rewards", value="\n".join(lines), inline=False)
+        else:
+            embed.add_field(name="Current Rewards", value="No level rewards configured", inline=False)
+            
+        prefix = await self.bot.get_prefix(ctx.message)
+        if isinstance(prefix, list):
+            prefix = prefix[0]
+        embed.add_field(
+            name="🔧 Commands",
+            value=f"`{prefix}levelrewards add <level> <role>` - Give a role at a level\n"
+                  f"`{prefix}levelrewards remove <level>` - Remove a level's reward\n"
+                  f"`{prefix}levelrewards sync` - Give members any rewards they're missing",
+            inline=False
+        )
+        embed.set_footer(text=f"Requested by {ctx.author.display_name}")
+        await ctx.send(embed=embed)
+        
+    @level_rewards_group.command(name='add')
+    @commands.has_permissions(manage_roles=True)
+    async def add_level_reward(self, ctx, level: int, role: discord.Role):
+        """Give a role to members who reach a level"""
+        if level < 1 or level > MAX_LEVEL:
+            embed = EmbedTemplates.error(
+                "Invalid Level",
+                f"Level must be between 1 and {MAX_LEVEL}!",
+                ctx.author
+            )
+            await ctx.send(embed=embed)
+            return
+            
+        if role >= ctx.guild.me.top_role or role.managed:
+            embed = EmbedTemplates.error(
+                "Bot Insufficient Permissions",
+                "I can only give roles that are below my highest role.",
+                ctx.author
+            )
+            await ctx.send(embed=embed)
+            return
+            
+        try:
+            await self.bot.db.execute("""
+                INSERT INTO level_rewards (guild_id, level, role_id) VALUES ($1, $2, $3)
+                ON CONFLICT (guild_id, level) DO UPDATE SET role_id = $3
+            """, ctx.guild.id, level, role.id)
+            self.level_rewards.pop(ctx.guild.id, None)
+            queued = await self.reconcile_level_rewards(ctx.guild)
+            
+            embed = EmbedTemplates.success(
+                "Level Reward Set",
+                f"Members will get {role.mention} at **Level {level}**! "
+                f"{queued} existing member{'s' if queued != 1 else ''} will receive it shortly.",
+                ctx.author
+            )
+            await ctx.send(embed=embed)
+            
+        except Exception as e:
+            embed = EmbedTemplates.error("Database Error", "Failed to set level reward.", ctx.author)
+            await ctx.send(embed=embed)
+            
+    @level_rewards_group.command(name='remove')
+    @commands.has_permissions(manage_roles=True)
+    async def remove_level_reward(self, ctx, level: int):
+        """Stop giving a role at a level"""
+        try:
+            result = await self.bot.db.execute(
+                "DELETE FROM level_rewards WHERE guild_id = $1 AND level = $2", ctx.guild.id, level
+            )
+            self.level_rewards.pop(ctx.guild.id, None)
+            
+            if result == "DELETE 0":
+                embed = EmbedTemplates.error(
+                    "Reward Not Found",
+                    f"No reward is set for Level {level}.",
+                    ctx.author
+                )
+            else:
+                embed = EmbedTemplates.success(
+                    "Level Reward Removed",
+                    f"Removed the reward for **Level {level}**!",
+                    ctx.author
+                )
+            await ctx.send(embed=embed)
+            
+        except Exception as e:
+            embed = EmbedTemplates.error("Database Error", "Failed to remove level reward.", ctx.author)
+            await ctx.send(embed=embed)
+            
+    @level_rewards_group.command(name='sync')
+    @commands.has_permissions(manage_roles=True)
+    async def sync_level_rewards(self, ctx):
+        """Give every member the reward roles they've earned but are missing"""
+        try:
+            queued = await self.reconcile_level_rewards(ctx.guild)
+            embed = EmbedTemplates.success(
+                "Level Rewards Synced",
+                f"Queued missing rewards for **{queued}** member{'s' if queued != 1 else ''}.",
+                ctx.author
+            )
+            await ctx.send(embed=embed)
+            
+        except Exception as e:
+            embed = EmbedTemplates.error("Database Error", "Failed to sync level rewards.", ctx.author)
+            await ctx.send(embed=embed)
+            
+    @commands.command(name='endseason')
+    @commands.has_permissions(administrator=True)
+    async def end_season(self, ctx, confirm: str = None):
+        """Archive the current leaderboard and reset everyone's XP"""
+        if confirm != 'confirm':
+            embed = EmbedTemplates.warning(
+                "End Season?",
+                "This archives the current leaderboard and resets **everyone's** XP and levels to zero.\n"
+                "Run the command again with `confirm` to continue.",
+                ctx.author
+            )
+            await ctx.send(embed=embed)
+            return
+            
+        try:
+            await self.flush_xp()
+            # Holding the flush lock keeps buffered writes out of the reset; on_message
+            # only touches memory, so it never waits on this
+            async with self.flush_lock:
+                async with self.bot.db.acquire() as conn:
+                    async with conn.transaction():
+                        season, started_at = await conn.fetchrow("""
+                            SELECT COALESCE(MAX(season), 0) + 1, MAX(ended_at)
+                            FROM leveling_seasons WHERE guild_id = $1
+                        """, ctx.guild.id)
+                        result = await conn.execute("""
+                            INSERT INTO user_levels_history (guild_id, season, user_id, xp, level, messages)
+                            SELECT guild_id, $2, user_id, xp, level, messages
+                            FROM user_levels WHERE guild_id = $1
+                        """, ctx.guild.id, season)
+                        members = int(result.split()[-1])
+                        await conn.execute("""
+                            UPDATE user_xp_totals t
+                            SET xp = t.xp - l.xp, messages = t.messages - l.messages
+                            FROM user_levels l
+                            WHERE l.guild_id = $1 AND l.user_id = t.user_id
+                        """, ctx.guild.id)
+                        await conn.execute("DELETE FROM user_levels WHERE guild_id = $1", ctx.guild.id)
+                        await conn.execute("""
+                            INSERT INTO leveling_seasons (guild_id, season, started_at, ended_at, members)
+                            VALUES ($1, $2, $3, $4, $5)
+                        """, ctx.guild.id, season, started_at, datetime.now(), members)
+                await self.reload_guild_cache(ctx.guild.id)
+                
+            embed = EmbedTemplates.success(
+                f"Season {season} Ended",
+                f"Archived **{members:,}** members and reset the leaderboard!\n"
+                f"View it any time with `leaderboard season:{season}`.",
+                ctx.author
+            )
+            await ctx.send(embed=embed)
+            
+        except Exception as e:
+            embed = EmbedTemplates.error(
+                "Database Error",
+                "Failed to end the season.",
+                ctx.author
+            )
+            await ctx.send(embed=embed)
+            
+    @commands.command(name='levelimport')
+    @commands.has_permissions(administrator=True)
+    async def level_import(self, ctx):
+        """Import member XP from an attached CSV or JSON dump"""
+        if not ctx.message.attachments:
+            embed = EmbedTemplates.error(
+                "Missing File",
+                "Attach a `.csv`, `.json` or `.jsonl` file (optionally `.gz`) with `user_id`, `xp` and `messages` columns!",
+                ctx.author
+            )
+            await ctx.send(embed=embed)
+            return
+            
+        attachment = ctx.message.attachments[0]
+        fd, path = tempfile.mkstemp(suffix='-' + os.path.basename(attachment.filename))
+        os.close(fd)
+        try:
+            await attachment.save(path)
+            await self.flush_xp()
+            curve = await self.get_level_curve(ctx.guild.id)
+            async with self.flush_lock:
+                async with self.bot.db.acquire() as conn:
+                    count = await import_user_levels(conn, ctx.guild.id, iter_import_records(path), curve)
+                await self.reload_guild_cache(ctx.guild.id)
+                
+            embed = EmbedTemplates.success(
+                "Import Complete",
+                f"Imported **{count:,}** rows and recalculated their levels!",
+                ctx.author
+            )
+            await ctx.send(embed=embed)
+            
+        except (ValueError, TypeError, csv.Error, UnicodeDecodeError) as e:
+            embed = EmbedTemplates.error(
+                "Invalid File",
+                f"Could not read the import file. Error: {str(e)}",
+                ctx.author
+            )
+            await ctx.send(embed=embed)
+        except Exception as e:
+            embed = EmbedTemplates.error(
+                "Database Error",
+                "Failed to import leveling data.",
+                ctx.author
+            )
+            await ctx.send(embed=embed)
+        finally:
+            os.remove(path)
+            
+    @commands.command(name='levelexport')
+    @commands.has_permissions(administrator=True)
+    async def level_export(self, ctx):
+        """Export this server's leveling data as a gzipped CSV"""
+        fd, path = tempfile.mkstemp(suffix='.csv.gz')
+        os.close(fd)
+        try:
+            await self.flush_xp()
+            async with self.bot.db.acquire() as conn:
+                await export_user_levels(conn, ctx.guild.id, path)
+            await ctx.send(
+                f"📦 Leveling data for **{ctx.guild.name}**",
+                file=discord.File(path, filename=f"levels-{ctx.guild.id}.csv.gz")
+            )
+            
+        except Exception as e:
+            embed = EmbedTemplates.error(
+                "Export Failed",
+                f"Failed to export leveling data. Error: {str(e)}",
+                ctx.author
+            )
+            await ctx.send(embed=embed)
+        finally:
+            os.remove(path)
 
 async def setup(bot):
-    await bot.add_cog(Leveling(bot))
\ No newline at end of file
+    await bot.add_cog(Leveling(bot))
+
+async def run_cli():
+    """Import or export a guild's leveling data from the command line.
+    
+    Run from the project root, e.g. `python -m cogs.leveling import 1234 dump.csv`.
+    A running bot keeps its cached standings until restarted.
+    """
+    parser = argparse.ArgumentParser(description="Bulk import or export leveling data")
+    parser.add_argument('action', choices=['import', 'export'])
+    parser.add_argument('guild_id', type=int)
+    parser.add_argument('path')
+    args = parser.parse_args()
+    
+    conn = await asyncpg.connect(os.getenv('DATABASE_URL'))
+    try:
+        if args.action == 'import':
+            curve = await fetch_level_curve(conn, args.guild_id)
+            count = await import_user_levels(conn, args.guild_id, iter_import_records(args.path), curve)
+            print(f"Imported {count:,} rows into guild {args.guild_id}")
+        else:
+            await export_user_levels(conn, args.guild_id, args.path)
+            print(f"Exported guild {args.guild_id} to {args.path}")
+    finally:
+        await conn.close()
+
+if __name__ == "__main__":
+    load_dotenv()
+    asyncio.run(run_cli())
\ No newline at end of file
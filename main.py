@@ -72,7 +72,7 @@ class DiscordBot(commands.Bot):
             self.db = None
             
         # Load cogs with error handling
-        cogs_to_load = ['cogs.help', 'cogs.moderation', 'cogs.leveling', 'cogs.automod', 'cogs.welcome', 'cogs.games']
+        cogs_to_load = ['cogs.help', 'cogs.moderation', 'cogs.leveling', 'cogs.automod', 'cogs.welcome', 'cogs.games', 'cogs.names', 'cogs.analytics', 'cogs.timers', 'cogs.escalation']
         for cog in cogs_to_load:
             try:
                 await self.load_extension(cog)
@@ -109,6 +109,12 @@ class DiscordBot(commands.Bot):
                 PRIMARY KEY (user_id, guild_id)
             )
         """)
+            
+            # Covering index for keyset-paginated leaderboards
+            await self.db.execute("""
+                CREATE INDEX IF NOT EXISTS idx_user_levels_leaderboard
+                ON user_levels (guild_id, level DESC, xp DESC, user_id DESC) INCLUDE (messages)
+            """)
         
         if self.db:
             await self.db.execute("""
@@ -121,6 +127,9 @@ class DiscordBot(commands.Bot):
                 warned_at TIMESTAMP DEFAULT NOW()
             )
         """)
+            await self.db.execute("""
+                CREATE INDEX IF NOT EXISTS idx_warnings_user_guild ON warnings (user_id, guild_id)
+            """)
         
         if self.db:
             await self.db.execute("""
@@ -134,6 +143,11 @@ class DiscordBot(commands.Bot):
                 nsfw_enabled BOOLEAN DEFAULT FALSE
             )
         """)
+            await self.db.execute("""
+                ALTER TABLE automod_settings
+                ADD COLUMN IF NOT EXISTS duplicates_enabled BOOLEAN DEFAULT FALSE,
+                ADD COLUMN IF NOT EXISTS phishing_enabled BOOLEAN DEFAULT FALSE
+            """)
         
         if self.db:
             await self.db.execute("""
@@ -155,6 +169,75 @@ class DiscordBot(commands.Bot):
                 leveling_enabled BOOLEAN DEFAULT TRUE
             )
         """)
+            await self.db.execute("""
+                ALTER TABLE leveling_settings ADD COLUMN IF NOT EXISTS xp_cooldown INTEGER DEFAULT 60
+            """)
+            await self.db.execute("""
+                ALTER TABLE leveling_settings
+                ADD COLUMN IF NOT EXISTS levelup_mode TEXT DEFAULT 'current',
+                ADD COLUMN IF NOT EXISTS levelup_channel BIGINT,
+                ADD COLUMN IF NOT EXISTS xp_min INTEGER DEFAULT 15,
+                ADD COLUMN IF NOT EXISTS xp_max INTEGER DEFAULT 25
+            """)
+        
+        if self.db:
+            await self.db.execute("""
+                CREATE TABLE IF NOT EXISTS xp_rules (
+                guild_id BIGINT,
+                rule_type TEXT,
+                target_id BIGINT,
+                multiplier REAL DEFAULT 1,
+                PRIMARY KEY (guild_id, rule_type, target_id)
+            )
+        """)
+        
+        if self.db:
+            await self.db.execute("""
+                CREATE TABLE IF NOT EXISTS leveling_seasons (
+                guild_id BIGINT,
+                season INTEGER,
+                started_at TIMESTAMP,
+                ended_at TIMESTAMP DEFAULT NOW(),
+                members INTEGER DEFAULT 0,
+                PRIMARY KEY (guild_id, season)
+            )
+        """)
+        
+        if self.db:
+            await self.db.execute("""
+                CREATE TABLE IF NOT EXISTS user_levels_history (
+                guild_id BIGINT,
+                season INTEGER,
+                user_id BIGINT,
+                xp BIGINT DEFAULT 0,
+                level INT DEFAULT 0,
+                messages INT DEFAULT 0,
+                PRIMARY KEY (guild_id, season, user_id)
+            )
+        """)
+            await self.db.execute("""
+                CREATE INDEX IF NOT EXISTS idx_user_levels_history_leaderboard
+                ON user_levels_history (guild_id, season, level DESC, xp DESC, user_id DESC) INCLUDE (messages)
+            """)
+        
+        if self.db:
+            await self.db.execute("""
+                CREATE TABLE IF NOT EXISTS level_rewards (
+                guild_id BIGINT,
+                level INTEGER,
+                role_id BIGINT,
+                PRIMARY KEY (guild_id, level)
+            )
+        """)
+        
+        if self.db:
+            await self.db.execute("""
+                CREATE TABLE IF NOT EXISTS leveling_curves (
+                guild_id BIGINT PRIMARY KEY,
+                base INTEGER DEFAULT 100,
+                growth INTEGER DEFAULT 100
+            )
+        """)
         
         if self.db:
             await self.db.execute("""
@@ -181,15 +264,85 @@ class DiscordBot(commands.Bot):
             )
         """)
         
+        if self.db:
+            await self.db.execute("""
+                CREATE TABLE IF NOT EXISTS user_names (
+                    user_id BIGINT PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    updated_at TIMESTAMP DEFAULT NOW()
+                )
+            """)
+            # Per-guild edits to the built-in NSFW word list; enabled = FALSE switches a default off
+            await self.db.execute("""
+                CREATE TABLE IF NOT EXISTS nsfw_keywords (
+                    guild_id BIGINT,
+                    keyword TEXT,
+                    whole_word BOOLEAN NOT NULL DEFAULT TRUE,
+                    enabled BOOLEAN NOT NULL DEFAULT TRUE,
+                    PRIMARY KEY (guild_id, keyword)
+                )
+            """)
+            # Guilds whose invites may be posted in a guild despite link blocking
+            await self.db.execute("""
+                CREATE TABLE IF NOT EXISTS invite_allowlist (
+                    guild_id BIGINT,
+                    target_guild_id BIGINT,
+                    PRIMARY KEY (guild_id, target_guild_id)
+                )
+            """)
+            # XP summed across guilds, maintained by the XP flush; backfilled once when first created
+            await self.db.execute("""
+                CREATE TABLE IF NOT EXISTS user_xp_totals (
+                    user_id BIGINT PRIMARY KEY,
+                    xp BIGINT NOT NULL DEFAULT 0,
+                    messages BIGINT NOT NULL DEFAULT 0
+                )
+            """)
+            await self.db.execute("""
+                INSERT INTO user_xp_totals (user_id, xp, messages)
+                SELECT user_id, SUM(xp), SUM(messages) FROM user_levels
+                WHERE NOT EXISTS (SELECT 1 FROM user_xp_totals)
+                GROUP BY user_id
+            """)
+            # Message counts per channel and hour since the epoch, folded into days after 30 days
+            await self.db.execute("""
+                CREATE TABLE IF NOT EXISTS activity_hourly (
+                    guild_id BIGINT,
+                    channel_id BIGINT,
+                    hour INTEGER,
+                    messages INTEGER NOT NULL,
+                    PRIMARY KEY (guild_id, hour, channel_id)
+                )
+            """)
+            await self.db.execute("""
+                CREATE TABLE IF NOT EXISTS activity_daily (
+                    guild_id BIGINT,
+                    channel_id BIGINT,
+                    day INTEGER,
+                    messages INTEGER NOT NULL,
+                    PRIMARY KEY (guild_id, day, channel_id)
+                )
+            """)
+        
     async def health_check(self, request):
         """Health endpoint for external monitoring"""
         return web.Response(text="Bot is alive!")
     
+    async def metrics(self, request):
+        """Sizes of in-memory caches reported by cogs that track them"""
+        data = {}
+        for cog in self.cogs.values():
+            get_metrics = getattr(cog, 'get_metrics', None)
+            if get_metrics:
+                data.update(get_metrics())
+        return web.json_response(data)
+    
     async def start_web_server(self):
         """Start web server for health checks"""
         try:
             app = web.Application()
             app.router.add_get('/health', self.health_check)
+            app.router.add_get('/metrics', self.metrics)
             runner = web.AppRunner(app)
             await runner.setup()
             site = web.TCPSite(runner, '0.0.0.0', 5000)
@@ -1,6 +1,7 @@
 import discord
 from discord.ext import commands
 from utils.embeds import EmbedTemplates
+from cogs.names import resolve_names
 from datetime import datetime, timedelta
 import re
 import asyncio
@@ -208,19 +209,21 @@ class Moderation(commands.Cog):
             await ctx.send(embed=embed)
             return
             
+        escalation = self.bot.get_cog('Escalation')
+        if not escalation:
+            embed = EmbedTemplates.error(
+                "Warning Failed",
+                "Warnings are unavailable while the escalation cog is not loaded.",
+                ctx.author
+            )
+            await ctx.send(embed=embed)
+            return
+            
         try:
-            # Add warning to database
-            warning_id = await self.bot.db.fetchval("""
-                INSERT INTO warnings (user_id, guild_id, moderator_id, reason)
-                VALUES ($1, $2, $3, $4)
-                RETURNING id
-            """, member.id, ctx.guild.id, ctx.author.id, reason or "No reason provided")
-            
-            # Get total warnings for user
-            warning_count = await self.bot.db.fetchval("""
-                SELECT COUNT(*) FROM warnings 
-                WHERE user_id = $1 AND guild_id = $2
-            """, member.id, ctx.guild.id)
+            # Store the warning and look up the escalation it reaches in one round trip
+            warning_id, warning_count, action = await escalation.issue_warning(
+                member, ctx.guild, ctx.author.id, reason or "No reason provided"
+            )
             
             # Send DM to user
             try:
@@ -237,6 +240,9 @@ class Moderation(commands.Cog):
             except:
                 pass  # User has DMs disabled
                 
+            # Escalate after the DM so a kicked or banned member still receives it
+            await escalation.escalate(member, ctx.guild, action, warning_count)
+                
             embed = discord.Embed(
                 title="⚠️ Warning Issued",
                 color=0xffa726,
@@ -248,6 +254,8 @@ class Moderation(commands.Cog):
             embed.add_field(name="Warning ID", value=f"#{warning_id}", inline=True)
             embed.add_field(name="Reason", value=reason or "No reason provided", inline=False)
             embed.add_field(name="Total Warnings", value=f"{warning_count}", inline=True)
+            if action:
+                embed.add_field(name="Escalation", value=action['action_type'].title(), inline=True)
             
             embed.set_thumbnail(url=member.avatar.url if member.avatar else member.default_avatar.url)
             embed.set_footer(text=f"User ID: {member.id}")
@@ -528,9 +536,10 @@ class Moderation(commands.Cog):
             
             embed.set_thumbnail(url=member.avatar.url if member.avatar else member.default_avatar.url)
             
+            # Resolve every moderator on the page at once instead of per warning
+            mod_names = await resolve_names(self.bot, [warning['moderator_id'] for warning in warnings[:10]])
             for i, warning in enumerate(warnings[:10], 1):  # Show max 10 warnings
-                moderator = self.bot.get_user(warning['moderator_id'])
-                mod_name = moderator.display_name if moderator else "Unknown"
+                mod_name = mod_names.get(warning['moderator_id'], "Unknown")
                 
                 embed.add_field(
                     name=f"Warning #{warning['id']}",
@@ -0,0 +1,144 @@
+from discord.ext import commands
+import asyncio
+from collections import OrderedDict
+
+NAME_FLUSH_INTERVAL = 30  # Seconds between batched writes of changed names
+NAME_CACHE_SIZE = 10000  # Global names kept in memory in front of the user_names table
+
+def global_name(user):
+    """A user's account-wide name; guild nicknames would leak into every other guild"""
+    return user.global_name or user.name
+
+async def resolve_names(bot, user_ids):
+    """Map user IDs to display names in one lookup, through the name cache when it is loaded"""
+    names_cog = bot.get_cog('UserNames')
+    if names_cog:
+        return await names_cog.resolve(user_ids)
+    names = {}
+    for user_id in user_ids:
+        user = bot.get_user(user_id)
+        if user:
+            names[user_id] = global_name(user)
+    return names
+
+class UserNames(commands.Cog):
+    """Remembers global names of users the bot has seen, for rendering lists of IDs"""
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.names = OrderedDict()  # user_id: global name, least recently used first
+        self.pending = {}  # user_id: display name not yet written to user_names
+        self.lookups = 0
+        self.db_lookups = 0
+        self.flush_stop = asyncio.Event()  # set on unload so the flush loop exits between writes
+        self.flush_task = None
+        self.start_name_flusher()
+
+    async def cog_unload(self):
+        # Cancelling mid-write would drop the batch the flush already took, so let it finish
+        self.flush_stop.set()
+        if self.flush_task:
+            await self.flush_task
+        await self.flush_names()
+
+    def get_metrics(self):
+        """Sizes of the name cache, for the /metrics endpoint"""
+        return {
+            'names_cached': len(self.names),
+            'names_pending': len(self.pending),
+            'names_lookups': self.lookups,
+            'names_db_lookups': self.db_lookups
+        }
+
+    def remember(self, user_id, name):
+        """Cache a name and queue it for the next write when it changed"""
+        if self.names.get(user_id) != name:
+            self.pending[user_id] = name
+        self.names[user_id] = name
+        self.names.move_to_end(user_id)
+        if len(self.names) > NAME_CACHE_SIZE:
+            self.names.popitem(last=False)
+
+    def observe(self, user):
+        if not user.bot:
+            self.remember(user.id, global_name(user))
+
+    async def resolve(self, user_ids):
+        """Map user IDs to display names with at most one query; unknown IDs are left out"""
+        self.lookups += 1
+        resolved = {}
+        missing = []
+        for user_id in dict.fromkeys(user_ids):
+            user = self.bot.get_user(user_id)
+            if user:
+                resolved[user_id] = global_name(user)
+                self.remember(user_id, global_name(user))
+            elif user_id in self.names:
+                resolved[user_id] = self.names[user_id]
+                self.names.move_to_end(user_id)
+            else:
+                missing.append(user_id)
+
+        if missing and self.bot.db:
+            self.db_lookups += 1
+            try:
+                rows = await self.bot.db.fetch(
+                    "SELECT user_id, name FROM user_names WHERE user_id = ANY($1::bigint[])", missing
+                )
+            except Exception as e:
+                print(f"Error resolving user names: {e}")
+                rows = []
+            for row in rows:
+                resolved[row['user_id']] = row['name']
+                self.names[row['user_id']] = row['name']
+            while len(self.names) > NAME_CACHE_SIZE:
+                self.names.popitem(last=False)
+        return resolved
+
+    def start_name_flusher(self):
+        """Start the background task that writes changed names to the database"""
+        if self.flush_task is None or self.flush_task.done():
+            self.flush_task = asyncio.create_task(self.name_flush_loop())
+
+    async def name_flush_loop(self):
+        while not self.bot.is_closed() and not self.flush_stop.is_set():
+            try:
+                await asyncio.wait_for(self.flush_stop.wait(), NAME_FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            await self.flush_names()
+
+    async def flush_names(self):
+        """Write every changed name in one statement"""
+        if not self.pending or not self.bot.db:
+            return
+        batch, self.pending = self.pending, {}
+        try:
+            await self.bot.db.execute("""
+                INSERT INTO user_names (user_id, name, updated_at)
+                SELECT user_id, name, NOW()
+                FROM unnest($1::bigint[], $2::text[]) AS batch(user_id, name)
+                ON CONFLICT (user_id) DO UPDATE SET name = EXCLUDED.name, updated_at = EXCLUDED.updated_at
+                WHERE user_names.name IS DISTINCT FROM EXCLUDED.name
+            """, list(batch), list(batch.values()))
+        except Exception as e:
+            print(f"Error flushing user names: {e}")
+            # Keep the batch unless a newer name arrived meanwhile
+            for user_id, name in batch.items():
+                self.pending.setdefault(user_id, name)
+
+    @commands.Cog.listener()
+    async def on_message(self, message):
+        self.observe(message.author)
+
+    @commands.Cog.listener()
+    async def on_member_join(self, member):
+        self.observe(member)
+
+    @commands.Cog.listener()
+    async def on_user_update(self, before, after):
+        if global_name(before) != global_name(after):
+            self.observe(after)
+
+async def setup(bot):
+    await bot.add_cog(UserNames(bot))
@@ -0,0 +1,24 @@
+import importlib
+import sys
+import types
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# The bot loads the modules at the repo root as cogs.<name>, so expose the root under that package
+if 'cogs' not in sys.modules:
+    cogs = types.ModuleType('cogs')
+    cogs.__path__ = [str(ROOT)]
+    sys.modules['cogs'] = cogs
+
+# utils.embeds ships with the bot's deployment rather than this tree; the code under test
+# only needs the name to import, so fall back to an empty placeholder when it is absent
+try:
+    importlib.import_module('utils.embeds')
+except ImportError:
+    utils = types.ModuleType('utils')
+    embeds = types.ModuleType('utils.embeds')
+    embeds.EmbedTemplates = type('EmbedTemplates', (), {})
+    utils.embeds = embeds
+    sys.modules['utils'] = utils
+    sys.modules['utils.embeds'] = embeds
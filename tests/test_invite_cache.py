@@ -0,0 +1,146 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("discord")
+
+from cogs.automod import AutoMod, InviteCache
+
+
+class FakeResolver:
+    """Invite resolver backed by a dict that counts its calls per code"""
+
+    def __init__(self, guilds, error=None):
+        self.guilds = guilds  # code: guild ID; missing codes are dead invites
+        self.error = error
+        self.calls = {}
+        self.release = None  # when set, lookups wait on this event before answering
+
+    async def __call__(self, code):
+        self.calls[code] = self.calls.get(code, 0) + 1
+        if self.release is not None:
+            await self.release.wait()
+        if self.error is not None:
+            raise self.error
+        return self.guilds.get(code)
+
+
+def make_automod(resolver, allowlists):
+    """An AutoMod with just the invite state, so no bot or background tasks are needed"""
+    automod = AutoMod.__new__(AutoMod)
+    automod.bot = SimpleNamespace(db=None)
+    automod.invite_cache = InviteCache(resolver)
+    automod.invite_allowlists = allowlists
+    return automod
+
+
+def test_resolves_each_code_once():
+    resolver = FakeResolver({'abc': 1})
+    cache = InviteCache(resolver)
+
+    assert asyncio.run(cache.resolve('abc', now=0)) == 1
+    assert asyncio.run(cache.resolve('abc', now=1)) == 1
+    assert resolver.calls == {'abc': 1}
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_live_invites_expire_after_ttl():
+    resolver = FakeResolver({'abc': 1})
+    cache = InviteCache(resolver, ttl=10, negative_ttl=5)
+
+    asyncio.run(cache.resolve('abc', now=0))
+    asyncio.run(cache.resolve('abc', now=9))
+    assert resolver.calls['abc'] == 1
+    asyncio.run(cache.resolve('abc', now=10))
+    assert resolver.calls['abc'] == 2
+
+
+def test_dead_invites_expire_after_negative_ttl():
+    resolver = FakeResolver({})
+    cache = InviteCache(resolver, ttl=10, negative_ttl=5)
+
+    assert asyncio.run(cache.resolve('gone', now=0)) is None
+    asyncio.run(cache.resolve('gone', now=4))
+    assert resolver.calls['gone'] == 1
+    asyncio.run(cache.resolve('gone', now=5))
+    assert resolver.calls['gone'] == 2
+
+
+def test_evicts_least_recently_used_code():
+    resolver = FakeResolver({'a': 1, 'b': 2, 'c': 3})
+    cache = InviteCache(resolver, max_size=2)
+
+    for code in ('a', 'b', 'a', 'c'):
+        asyncio.run(cache.resolve(code, now=0))
+    assert list(cache.entries) == ['a', 'c']
+    asyncio.run(cache.resolve('b', now=0))
+    assert resolver.calls['b'] == 2
+
+
+def test_errors_are_not_cached():
+    resolver = FakeResolver({'abc': 1}, error=RuntimeError("rate limited"))
+    cache = InviteCache(resolver)
+
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            asyncio.run(cache.resolve('abc', now=0))
+    assert resolver.calls['abc'] == 2
+    assert len(cache) == 0
+    assert not cache.in_flight
+
+
+def test_concurrent_lookups_share_one_call():
+    resolver = FakeResolver({'abc': 1})
+    cache = InviteCache(resolver)
+
+    async def scenario():
+        resolver.release = asyncio.Event()
+        lookups = [asyncio.create_task(cache.resolve('abc', now=0)) for _ in range(3)]
+        await asyncio.sleep(0)
+        resolver.release.set()
+        return await asyncio.gather(*lookups)
+
+    assert asyncio.run(scenario()) == [1, 1, 1]
+    assert resolver.calls == {'abc': 1}
+    assert not cache.in_flight
+
+
+def test_cancelled_caller_leaves_lookup_for_the_others():
+    resolver = FakeResolver({'abc': 1})
+    cache = InviteCache(resolver)
+
+    async def scenario():
+        resolver.release = asyncio.Event()
+        first = asyncio.create_task(cache.resolve('abc', now=0))
+        second = asyncio.create_task(cache.resolve('abc', now=0))
+        await asyncio.sleep(0)
+        first.cancel()
+        resolver.release.set()
+        return first, await second
+
+    first, result = asyncio.run(scenario())
+    assert first.cancelled()
+    assert result == 1
+    assert resolver.calls == {'abc': 1}
+    assert cache.entries['abc'][1] == 1
+
+
+def test_invites_allowed_for_own_and_allowlisted_guilds():
+    resolver = FakeResolver({'home': 1, 'partner': 2, 'other': 3})
+    automod = make_automod(resolver, {1: frozenset({2})})
+    guild = SimpleNamespace(id=1)
+
+    assert asyncio.run(automod.is_invite_allowed(guild, '', 'home'))
+    assert asyncio.run(automod.is_invite_allowed(guild, '', 'partner'))
+    assert not asyncio.run(automod.is_invite_allowed(guild, '', 'other'))
+    assert not asyncio.run(automod.is_invite_allowed(guild, '', 'gone'))
+
+
+def test_third_party_invite_links_are_never_allowed():
+    resolver = FakeResolver({'home': 1})
+    automod = make_automod(resolver, {1: frozenset()})
+    guild = SimpleNamespace(id=1)
+
+    assert not asyncio.run(automod.is_invite_allowed(guild, 'io', 'home'))
+    assert resolver.calls == {}
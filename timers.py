@@ -0,0 +1,110 @@
+import discord
+from discord.ext import commands
+import asyncio
+import time
+from datetime import timedelta
+
+TIMER_WHEEL_SIZE = 3600  # One slot per second; longer delays are capped at an hour
+BULK_DELETE_LIMIT = 100  # Most messages one delete_messages call accepts
+BULK_DELETE_MAX_AGE = timedelta(days=14)  # Older messages can't be bulk deleted
+
+async def delete_message_ids(channel, message_ids):
+    """Delete messages by ID with as few calls as possible; returns the number of bulk calls"""
+    bulk_deletes = 0
+    cutoff = discord.utils.time_snowflake(discord.utils.utcnow() - BULK_DELETE_MAX_AGE)
+    recent = [discord.Object(id=message_id) for message_id in message_ids if message_id > cutoff]
+    for start in range(0, len(recent), BULK_DELETE_LIMIT):
+        chunk = recent[start:start + BULK_DELETE_LIMIT]
+        try:
+            await channel.delete_messages(chunk)
+            bulk_deletes += 1
+        except discord.NotFound:
+            # Someone already deleted one of them; the rest go one by one
+            for partial in chunk:
+                try:
+                    await channel.get_partial_message(partial.id).delete()
+                except discord.NotFound:
+                    pass
+    # The bulk endpoint rejects messages older than two weeks
+    for message_id in message_ids:
+        if message_id <= cutoff:
+            try:
+                await channel.get_partial_message(message_id).delete()
+            except discord.NotFound:
+                pass
+    return bulk_deletes
+
+class Timers(commands.Cog):
+    """Timing wheel that deletes messages at a given time for every cog.
+
+    Handlers register a deletion and return right away. Once a second the wheel
+    sweeps the slots that came due and deletes their messages with one bulk call
+    per channel.
+    """
+    def __init__(self, bot):
+        self.bot = bot
+        self.slots = [None] * TIMER_WHEEL_SIZE  # slot: {channel_id: (channel, [message_ids])}
+        self.cursor = int(time.monotonic())  # last whole second swept
+        self.pending = 0
+        self.bulk_deletes = 0
+        self.timer_task = None
+        self.start_timer()
+
+    async def cog_unload(self):
+        if self.timer_task:
+            self.timer_task.cancel()
+        # Don't leave notices behind when the wheel goes away
+        await self.run_due(self.cursor + TIMER_WHEEL_SIZE)
+
+    def get_metrics(self):
+        """Sizes of the timer wheel, for the /metrics endpoint"""
+        return {
+            'timers_pending_deletes': self.pending,
+            'timers_bulk_deletes': self.bulk_deletes
+        }
+
+    def delete_later(self, channel, message_ids, delay):
+        """Delete messages from a channel after delay seconds"""
+        delay = min(max(delay, 0), TIMER_WHEEL_SIZE - 1)
+        # The slot for the second after the deadline, and never one already swept
+        tick = max(int(time.monotonic() + delay) + 1, self.cursor + 1)
+        index = tick % TIMER_WHEEL_SIZE
+        if self.slots[index] is None:
+            self.slots[index] = {}
+        entry = self.slots[index].setdefault(channel.id, (channel, []))
+        entry[1].extend(message_ids)
+        self.pending += len(message_ids)
+
+    def start_timer(self):
+        """Start the background task that sweeps the wheel"""
+        if self.timer_task is None or self.timer_task.done():
+            self.timer_task = asyncio.create_task(self.timer_loop())
+
+    async def timer_loop(self):
+        while not self.bot.is_closed():
+            await asyncio.sleep(1)
+            try:
+                await self.run_due(int(time.monotonic()))
+            except Exception as e:
+                print(f"Error running timers: {e}")
+
+    async def run_due(self, second):
+        """Delete everything in the slots up to second, merged per channel"""
+        due = {}
+        for tick in range(self.cursor + 1, min(second, self.cursor + TIMER_WHEEL_SIZE) + 1):
+            slot = self.slots[tick % TIMER_WHEEL_SIZE]
+            if slot:
+                for channel_id, (channel, message_ids) in slot.items():
+                    due.setdefault(channel_id, (channel, []))[1].extend(message_ids)
+                self.slots[tick % TIMER_WHEEL_SIZE] = None
+        self.cursor = max(self.cursor, second)
+
+        for channel, message_ids in due.values():
+            self.pending -= len(message_ids)
+            try:
+                self.bulk_deletes += await delete_message_ids(channel, message_ids)
+            except discord.HTTPException as e:
+                print(f"Error deleting scheduled messages: {e}")
+
+async def setup(bot):
+    await bot.add_cog(Timers(bot))